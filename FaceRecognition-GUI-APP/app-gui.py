@@ -1,18 +1,27 @@
+import argparse
 import tkinter as tk
 from tkinter import ttk, messagebox, font as tkfont
 from PIL import Image, ImageTk
 import cv2
-import numpy as np
 from database import FaceRecognitionDB
-from time import time
 import os
 from spoofing_detection import SpoofingDetector
+from detector_registry import registry as detector_registry
+from frame_analysis import FrameAnalyzer, TrackingFrameAnalyzer
+from camera import open_frame_source
+from enrollment import EnrollmentSampler, MIN_TRAINING_IMAGES, capture_faces
+from workers import VerificationWorker, RecognitionWorker, poll_worker
+from scheduler import DEFAULT_STAGE_RATES
+from identification import FaceIdentifier
+from training_service import TrainingService
+from metrics import metrics, MetricsServer, MetricsLogger
 
 class AdminPanel(tk.Toplevel):
-    def __init__(self, parent, db):
+    def __init__(self, parent, db, trainer=None):
         super().__init__(parent)
         self.title("Admin Panel")
         self.db = db
+        self.trainer = trainer
         self.geometry("1200x800")
         
         # Configure style
@@ -168,7 +177,19 @@ class AdminPanel(tk.Toplevel):
             if login.get('spoofing_attempt', False):
                 status += " (Spoofing)"
             stats_text += f"\n{login['login_time']} - {login['username']} ({status})"
-        
+
+        # Classifier cache stats
+        cache = self.db.classifier_cache.get_stats()
+        stats_text += (f"\n\nClassifier Cache: {cache['entries']} loaded "
+                       f"({cache['bytes'] / (1024 * 1024):.1f} MB), {cache['hits']} hits, "
+                       f"{cache['misses']} misses, {cache['evictions']} evictions")
+
+        # Detector cache stats
+        stats_text += "\nLoaded Detectors:"
+        for (kind, name), info in detector_registry.get_stats().items():
+            stats_text += (f"\n{kind}: {os.path.basename(name)} - loaded in "
+                           f"{info['load_time'] * 1000:.1f} ms, {info['hits']} cache hits")
+
         self.stats_text.delete(1.0, tk.END)
         self.stats_text.insert(tk.END, stats_text)
         
@@ -196,6 +217,9 @@ class AdminPanel(tk.Toplevel):
         
         if messagebox.askyesno("Confirm", f"Delete user '{username}' and all their data?"):
             if self.db.delete_user(user_id):
+                # Retrain the shared model in the background without the user's samples
+                if self.trainer is not None:
+                    self.trainer.rebuild_identifier()
                 messagebox.showinfo("Success", "User deleted successfully")
                 self.load_users()
                 self.load_stats()
@@ -218,23 +242,16 @@ class AdminPanel(tk.Toplevel):
             
         if messagebox.askyesno("Confirm", 
                              f"{'Remove' if current_status else 'Grant'} admin privileges for '{username}'?"):
-            self.cursor = self.db.conn.cursor()
-            self.cursor.execute(
-                "UPDATE users SET is_admin = ? WHERE id = ?",
-                (not current_status, user_id)
-            )
-            self.db.conn.commit()
+            self.db.set_admin(user_id, not current_status)
             self.load_users()
     
     def clear_history(self):
         if messagebox.askyesno("Confirm", "Clear all login history?"):
-            self.cursor = self.db.conn.cursor()
-            self.cursor.execute("DELETE FROM login_history")
-            self.db.conn.commit()
+            self.db.clear_login_history()
             self.load_history()
 
 class FaceRecognitionApp(tk.Tk):
-    def __init__(self):
+    def __init__(self, frame_source=0, realtime_playback=True):
         super().__init__()
         self.title("Face Recognition System")
         self.geometry("1000x700")
@@ -242,8 +259,15 @@ class FaceRecognitionApp(tk.Tk):
         
         # Initialize database
         self.db = FaceRecognitionDB()
+        self.identifier = FaceIdentifier(self.db)  # Shared 1:N model
+        self.trainer = TrainingService(self.db, self.identifier)  # Background training processes
         self.current_user = None
-        self.spoofing_detector = SpoofingDetector()
+        self.frame_analyzer = FrameAnalyzer()
+        self.spoofing_detector = SpoofingDetector(self.frame_analyzer)
+        self.face_tracking = True  # Downscaled, ROI-tracked detection in the live loops
+        self.stage_rates = dict(DEFAULT_STAGE_RATES)  # Hz per camera loop stage; lower them on slow hardware
+        self.frame_source = frame_source  # Camera index, video file, image directory or "synthetic[:image]"
+        self.realtime_playback = realtime_playback  # False plays recordings back at maximum speed
         
         # Configure styles
         self.style = ttk.Style()
@@ -268,6 +292,7 @@ class FaceRecognitionApp(tk.Tk):
             page.grid(row=0, column=0, sticky="nsew")
         
         self.show_page("StartPage")
+        self.poll_training()
     
     def show_page(self, page_name):
         """Show the specified page"""
@@ -278,14 +303,32 @@ class FaceRecognitionApp(tk.Tk):
         if hasattr(page, 'update_admin_button'):
             page.update_admin_button()
     
+    def poll_training(self):
+        """Forward training progress and results to the Train page"""
+        for event in self.trainer.poll():
+            self.pages["TrainPage"].on_training_event(event)
+        self.after(200, self.poll_training)
+    
+    def open_frame_source(self):
+        """New (unstarted) frame source for one capture, login or recognition loop"""
+        return open_frame_source(self.frame_source, realtime=self.realtime_playback)
+    
+    def create_loop_analyzer(self):
+        """Frame analyzer for one camera loop (tracking keeps per-loop state)"""
+        if self.face_tracking:
+            return TrackingFrameAnalyzer(self.frame_analyzer.face_cascade)
+        return self.frame_analyzer
+    
     def open_admin_panel(self):
         """Open the admin panel"""
         if self.current_user and self.current_user.get('is_admin'):
-            AdminPanel(self, self.db)
+            AdminPanel(self, self.db, self.trainer)
         else:
             messagebox.showerror("Access Denied", "Admin privileges required")
     
     def __del__(self):
+        if hasattr(self, 'trainer'):
+            self.trainer.shutdown(wait=False)
         if hasattr(self, 'db'):
             self.db.close()
 
@@ -366,10 +409,17 @@ class LoginPage(ttk.Frame):
         
         ttk.Button(btn_frame, text="Login", command=self.attempt_login).pack(side='left', padx=10)
         ttk.Button(btn_frame, text="Back", 
-                  command=lambda: controller.show_page("StartPage")).pack(side='left', padx=10)
+                  command=self.go_back).pack(side='left', padx=10)
         
         # Configure column weights
         form.columnconfigure(1, weight=1)
+        
+        # Background face verification, if one is running
+        self.worker = None
+    
+    def go_back(self):
+        self.cancel_verification()
+        self.controller.show_page("StartPage")
     
     def attempt_login(self):
         username = self.username.get()
@@ -393,133 +443,53 @@ class LoginPage(ttk.Frame):
         self.controller.current_user = user_info  
         
         # Then verify face matches with delay and spoofing detection
-        if self.verify_face_with_delay(username, user_info['id']):
-            self.controller.db.update_last_login(user_info['id'])
-            self.controller.db.log_login_attempt(user_info['id'], True)
+        self.verify_face_with_delay(username, user_info['id'], self.finish_login)
+    
+    def finish_login(self, verified):
+        """Called on the Tk thread once face verification has finished"""
+        user_id = self.controller.current_user['id']
+        if verified:
+            self.controller.db.update_last_login(user_id)
+            self.controller.db.log_login_attempt(user_id, True)
             messagebox.showinfo("Success", "Login successful!")
             self.controller.show_page("RecognizePage")
         else:
-            self.controller.db.log_login_attempt(user_info['id'], False)
+            self.controller.db.log_login_attempt(user_id, False)
             messagebox.showerror("Error", "Face verification failed!")
     
-
-    def verify_face_with_delay(self, username, user_id):
-        """Face verification function with delay and spoofing detection"""
+    def verify_face_with_delay(self, username, user_id, on_result):
+        """
+        Face verification function with delay and spoofing detection
+        
+        The camera loop runs on a VerificationWorker thread; on_result(verified)
+        is called on the Tk thread when it finishes.
+        """
+        if self.worker and self.worker.is_alive():
+            return
+        
         classifier = self.controller.db.get_classifier(user_id)
         if not classifier:
             messagebox.showerror("Error", "No trained model found. Please register first.")
-            return False
-        
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        cap = cv2.VideoCapture(0)
-        start_time = time()
-        verified = False
-        spoofing_detected = False
-        verification_start_time = 0
-        spoofing_start_time = 0
-        
-        # Timing parameters
-        min_verification_time = 12  # Minimum seconds to show verification
-        min_spoofing_time = 12      # Minimum seconds to show spoofing warning
-        max_timeout = 30           # Maximum time to attempt verification
-        
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-                
-            current_time = time()
-            elapsed_time = current_time - start_time
-            
-            # Perform spoofing detection on the frame
-            is_spoofing, spoofing_confidence, _ = self.controller.spoofing_detector.detect_spoofing(frame)
-            
-            if is_spoofing and not spoofing_detected:
-                spoofing_detected = True
-                spoofing_start_time = current_time
-            
-            # If spoofing was detected but now it's gone, reset
-            if spoofing_detected and not is_spoofing:
-                spoofing_detected = False
-                
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = face_cascade.detectMultiScale(gray, 1.3, 5)
-            
-            if len(faces) > 0:
-                (x, y, w, h) = faces[0]
-                
-                if spoofing_detected:
-                    # Draw spoofing warning
-                    cv2.rectangle(frame, (0, 0), (frame.shape[1]-1, frame.shape[0]-1), (0, 0, 255), 10)
-                    cv2.putText(frame, "SPOOFING DETECTED!", (50, 50), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 3)
-                    cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 0, 255), 2)
-                    cv2.putText(frame, "FAKE FACE", (x, y-10), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
-                else:
-                    # Only proceed with verification if no spoofing detected
-                    roi_gray = gray[y:y+h, x:x+w]
-                    id, confidence = classifier.predict(roi_gray)
-                    confidence = 100 - confidence
-                    
-                    if confidence > 60:  # Verification threshold
-                        if not verified:
-                            verification_start_time = current_time
-                        verified = True
-                        text = f'Hi: {username}'
-                        color = (0, 255, 0)
-                    else:
-                        verified = False
-                        text = "Unkown User"
-                        color = (0, 0, 255)
-                        
-                    cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
-                    cv2.putText(frame, text, (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
-                    
-                    # Add border color based on verification status
-                    border_color = (0, 255, 0) if verified else (0, 0, 255)
-                    cv2.rectangle(frame, (0, 0), (frame.shape[1]-1, frame.shape[0]-1), border_color, 10)
-            
-            # Show the frame
-            cv2.imshow("Face Verification", frame)
-            
-            # Check conditions to end verification
-            if spoofing_detected:
-                # Require spoofing to persist for minimum time
-                if (current_time - spoofing_start_time) >= min_spoofing_time:
-                    break
-            elif verified:
-                # Require verification to persist for minimum time
-                if (current_time - verification_start_time) >= min_verification_time:
-                    break
-                    
-            # Timeout after max_timeout seconds
-            if elapsed_time >= max_timeout:
-                break
-                
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
-                
-        cap.release()
-        cv2.destroyAllWindows()
+            on_result(False)
+            return
         
-        if spoofing_detected:
-            # Show spoofing warning for an additional 2 seconds before closing
-            warning_end_time = time() + 2
-            cap = cv2.VideoCapture(0)
-            while time() < warning_end_time:
-                ret, frame = cap.read()
-                if ret:
-                    cv2.rectangle(frame, (0, 0), (frame.shape[1]-1, frame.shape[0]-1), (0, 0, 255), 10)
-                    cv2.putText(frame, "SPOOFING DETECTED!", (50, 50), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 3)
-                    cv2.imshow("Face Verification", frame)
-                    cv2.waitKey(30)
-            cap.release()
-            cv2.destroyAllWindows()
-            return False
-        
-        return verified
+        self.worker = VerificationWorker(username, classifier,
+                                         self.controller.create_loop_analyzer(),
+                                         self.controller.spoofing_detector,
+                                         source=self.controller.open_frame_source(),
+                                         stage_rates=self.controller.stage_rates)
+        self.worker.start()
+        
+        def on_done(result):
+            # Cancelled by Back or 'q': the user left, so there is nothing to log or report
+            if not result['cancelled']:
+                on_result(result.get('verified', False))
+        poll_worker(self, self.worker, on_done)
+    
+    def cancel_verification(self):
+        """Stop a running verification, e.g. when leaving the page"""
+        if self.worker:
+            self.worker.cancel()
 
 class RegisterPage(ttk.Frame):
     def __init__(self, parent, controller):
@@ -621,44 +591,51 @@ class CapturePage(ttk.Frame):
         self.update()
         
         user_id = self.controller.current_user['id']
-        num_images = 300  # Target number of images
+        num_images = 100  # Target number of distinct, sharp images
         
         # Start capture process
-        detector = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        cap = cv2.VideoCapture(0)
-        count = 0
-        
-        while count < num_images:
-            ret, frame = cap.read()
-            if not ret:
-                break
-                
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = detector.detectMultiScale(gray, 1.3, 5)
-            
-            for (x, y, w, h) in faces:
-                cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 0, 255), 2)
-                face_img = frame[y:y+h, x:x+w]
-                
-                # Save to database
-                if self.controller.db.save_face_image(user_id, face_img):
-                    count += 1
+        analyzer = self.controller.create_loop_analyzer()
+        sampler = EnrollmentSampler()
+        cap = self.controller.open_frame_source().start()
+        
+        def show_frame(frame, box, reason, count):
+            if box is not None:
+                x, y, w, h = box
+                if reason is None:
                     self.status_var.set(f"Captured {count}/{num_images} images")
                     self.update()
-                    cv2.putText(frame, f"Captured: {count}/{num_images}", (x, y-10), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+                    color, label = (0, 0, 255), f"Captured: {count}/{num_images}"
+                elif reason == 'duplicate':
+                    color, label = (0, 255, 255), "Move your head slightly"
+                else:
+                    color, label = (0, 255, 255), "Hold still"
+                cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
+                cv2.putText(frame, label, (x, y-10), 
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
             
-            cv2.imshow("Face Capture", frame)
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+            with metrics.timer('gui.imshow'):
+                cv2.imshow("Face Capture", frame)
+            return cv2.waitKey(1) & 0xFF != ord('q')
+        
+        # Only the largest face is enrolled, and only if it is sharp and new.
+        # Images are encoded off-thread and committed in batches
+        with self.controller.db.face_image_writer(user_id) as writer:
+            capture_faces(cap, analyzer, sampler, writer, num_images, on_frame=show_frame)
         
         cap.release()
         cv2.destroyAllWindows()
         
-        if count >= 50:  # Minimum number of images to enable training
+        # Images that failed to encode or insert are not counted
+        count = writer.saved
+        if writer.error:
+            messagebox.showerror("Error", f"Failed to save face images: {writer.error}")
+        
+        if count >= MIN_TRAINING_IMAGES:
             self.train_btn.config(state='normal')
         
-        self.status_var.set(f"Capture complete. {count} images captured.")
+        stats = sampler.get_stats()
+        self.status_var.set(f"Capture complete. {count} images captured "
+                            f"({stats['duplicate']} duplicates and {stats['blurry']} blurry frames skipped).")
 
 class TrainPage(ttk.Frame):
     def __init__(self, parent, controller):
@@ -692,50 +669,54 @@ class TrainPage(ttk.Frame):
                   command=lambda: controller.show_page("RecognizePage")).pack(pady=10)
     
     def train_model(self):
-        self.status_var.set("Training model...")
-        self.update()
-        
         user_id = self.controller.current_user['id']
         image_count = self.controller.db.get_face_image_count(user_id)
         
-        if image_count < 50:
-            messagebox.showerror("Error", "Need at least 50 images to train!")
+        if image_count < MIN_TRAINING_IMAGES:
+            messagebox.showerror("Error", f"Need at least {MIN_TRAINING_IMAGES} images to train!")
             self.status_var.set("Training failed - not enough images")
             return
         
-        # Get face images from database
-        face_images = self.controller.db.get_face_images(user_id)
-        if not face_images:
-            messagebox.showerror("Error", "No face images found!")
-            self.status_var.set("Training failed - no images")
-            return
-        
-        # Prepare training data
-        faces = []
-        ids = []
-        
-        for img_data in face_images:
-            gray = cv2.cvtColor(img_data['image'], cv2.COLOR_BGR2GRAY)
-            faces.append(gray)
-            ids.append(0)  # All images belong to user_id 0 (the current user)
-        
-        ids = np.array(ids)
-        
-        # Train the classifier
+        # Train in a background process (only images added since the last training are processed);
+        # progress and the result arrive through on_training_event
         try:
-            classifier = cv2.face.LBPHFaceRecognizer_create()
-            classifier.train(faces, ids)
-            
-            # Save to database
-            if self.controller.db.save_classifier(user_id, classifier, image_count):
-                self.status_var.set("Training completed successfully!")
-                messagebox.showinfo("Success", "Model trained successfully!")
+            if self.controller.trainer.submit(user_id):
+                self.status_var.set("Training model...")
             else:
-                self.status_var.set("Training failed - database error")
-                messagebox.showerror("Error", "Failed to save classifier")
+                self.status_var.set("Training is already queued for this user")
         except Exception as e:
             self.status_var.set(f"Training failed - {str(e)}")
             messagebox.showerror("Error", f"Training failed: {str(e)}")
+    
+    def on_training_event(self, event):
+        """Show a TrainingService event if it belongs to the current user"""
+        kind, user_id = event[0], event[1]
+        if not self.controller.current_user or user_id != self.controller.current_user['id']:
+            return
+        
+        if kind == 'progress':
+            done, total = event[2], event[3]
+            if done < total:
+                self.status_var.set(f"Training model... {done}/{total} images")
+            else:
+                # Fold the new images into the shared identification model
+                self.status_var.set("Updating identification model...")
+            return
+        
+        result = event[2]
+        if result['error']:
+            self.status_var.set(f"Training failed - {result['error']}")
+            messagebox.showerror("Error", f"Training failed: {result['error']}")
+        elif result['saved']:
+            if result['incremental']:
+                self.status_var.set(f"Training completed successfully! "
+                                    f"({result['new_images']} new images)")
+            else:
+                self.status_var.set("Training completed successfully!")
+            messagebox.showinfo("Success", "Model trained successfully!")
+        else:
+            self.status_var.set("Training failed - database error")
+            messagebox.showerror("Error", "Failed to save classifier")
 
 class RecognizePage(ttk.Frame):
     def __init__(self, parent, controller):
@@ -760,10 +741,21 @@ class RecognizePage(ttk.Frame):
         btn_frame.pack(pady=20)
         
         ttk.Button(btn_frame, text="Start Recognition", command=self.start_recognition).pack(side='left', padx=10)
+        ttk.Button(btn_frame, text="Identify", command=self.start_identification).pack(side='left', padx=10)
         ttk.Button(btn_frame, text="Back", 
-                  command=lambda: controller.show_page("StartPage")).pack(side='left', padx=10)
+                  command=self.go_back).pack(side='left', padx=10)
+        
+        # Background recognition, if one is running
+        self.worker = None
+    
+    def go_back(self):
+        self.cancel_recognition()
+        self.controller.show_page("StartPage")
     
     def start_recognition(self):
+        if self.worker and self.worker.is_alive():
+            return
+        
         user_id = self.controller.current_user['id']
         classifier = self.controller.db.get_classifier(user_id)
         
@@ -771,148 +763,72 @@ class RecognizePage(ttk.Frame):
             messagebox.showerror("Error", "No trained model found. Please train first.")
             return
         
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        cap = cv2.VideoCapture(0)
-        start_time = time()
-        recognized = False
-        confidence_level = 0
-        last_face_time = time()
-        spoofing_detected = False
-        spoofing_start_time = 0
-        
-        # Minimum durations
-        min_recognition_time = 3  # seconds to show recognition
-        min_spoofing_time = 3     # seconds to show spoofing warning
-        max_timeout = 30          # total timeout
-        
-        self.status_var.set("Looking for face...")
-        self.update()
+        # The camera loop runs on a worker thread; results come back through poll_worker
+        self.worker = RecognitionWorker(classifier,
+                                        self.controller.create_loop_analyzer(),
+                                        self.controller.spoofing_detector,
+                                        source=self.controller.open_frame_source(),
+                                        stage_rates=self.controller.stage_rates)
+        self.worker.start()
+        poll_worker(self, self.worker, self.finish_recognition, self.status_var.set)
+    
+    def start_identification(self):
+        """Identify whoever is in front of the camera with the shared multi-user model"""
+        if self.worker and self.worker.is_alive():
+            return
         
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-                
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = face_cascade.detectMultiScale(gray, 1.3, 5)
-
-            current_time = time()
-            elapsed_time = current_time - start_time
-            
-            # Perform spoofing detection on the frame
-            spoofing_result, spoofing_confidence, spoofing_frame = self.controller.spoofing_detector.detect_spoofing(frame)
-            
-            if len(faces) > 0:
-                last_face_time = current_time
-                (x, y, w, h) = faces[0]
-                roi_gray = gray[y:y+h, x:x+w]
-                
-                # Track when spoofing is first detected
-                if spoofing_result and not spoofing_detected:
-                    spoofing_detected = True
-                    spoofing_start_time = current_time
-                
-                # If spoofing was detected but now it's gone, reset
-                if spoofing_detected and not spoofing_result:
-                    spoofing_detected = False
-                
-                # Only proceed with recognition if no spoofing detected for at least 1 second
-                if not spoofing_detected or (current_time - spoofing_start_time < 1):
-                    try:
-                        id, confidence = classifier.predict(roi_gray)
-                        confidence_level = 100 - confidence
-                        
-                        if confidence_level > 50:  # Recognition threshold
-                            if not recognized:
-                                recognition_start_time = current_time
-                            recognized = True
-                            text = f'Recognized'
-                            color = (0, 255, 0)
-                            #self.status_var.set(f"Recognized! Confidence: {confidence_level:.1f}%")
-                        else:
-                            recognized = False
-                            text = "Unknown User"
-                            color = (0, 0, 255)
-                            self.status_var.set("Verification failed")
-                        
-                        cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
-                        cv2.putText(frame, text, (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
-                        
-                        # Add additional visual feedback
-                        if recognized:
-                            # Draw a green border around the entire frame when recognized
-                            cv2.rectangle(frame, (0, 0), (frame.shape[1]-1, frame.shape[0]-1), (0, 255, 0), 10)
-                        else:
-                            # Draw a red border when not recognized
-                            cv2.rectangle(frame, (0, 0), (frame.shape[1]-1, frame.shape[0]-1), (0, 0, 255), 10)
-                        
-                    except Exception as e:
-                        print(f"Recognition error: {e}")
-                        recognized = False
-                else:
-                    # Spoofing detected for more than 1 second - show warning
-                    recognized = False
-                    self.status_var.set(f"Spoofing detected!")
-                    
-                    # Draw spoofing warning on frame
-                    cv2.rectangle(frame, (0, 0), (frame.shape[1]-1, frame.shape[0]-1), (0, 0, 255), 10)
-                    cv2.putText(frame, "SPOOFING ATTACK DETECTED!", (50, 50), 
-                                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 3)
-                    
-                    # Draw the face rectangle in red
-                    cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 0, 255), 2)
-                    cv2.putText(frame, f"FAKE FACE", (x, y-10), 
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
-            else:
-                # No face detected
-                if current_time - last_face_time > 2:  # 2 seconds without face
-                    self.status_var.set("No face detected")
-                recognized = False
-                spoofing_detected = False
-            
-            # Show the frame
-            cv2.imshow("Face Recognition", frame)
-            self.update()
-            
-            # Check conditions to end recognition
-            if recognized and (current_time - recognition_start_time) >= min_recognition_time:
-                break
-                
-            if spoofing_detected and (current_time - spoofing_start_time) >= min_spoofing_time:
-                break
-                
-            # Timeout after max_timeout seconds
-            if elapsed_time >= max_timeout:
-                break
-                
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
-                
-        cap.release()
-        cv2.destroyAllWindows()
+        if not self.controller.identifier.load():
+            messagebox.showerror("Error", "No identification model found. Please train first.")
+            return
         
-        if spoofing_detected:
-            # Show spoofing warning for an additional 2 seconds before closing
-            warning_end_time = time() + 2
-            cap = cv2.VideoCapture(0)
-            while time() < warning_end_time:
-                ret, frame = cap.read()
-                if ret:
-                    cv2.rectangle(frame, (0, 0), (frame.shape[1]-1, frame.shape[0]-1), (0, 0, 255), 10)
-                    cv2.putText(frame, "SPOOFING ATTACK DETECTED!", (50, 50), 
-                                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 3)
-                    cv2.imshow("Face Recognition", frame)
-                    cv2.waitKey(30)
-            cap.release()
-            cv2.destroyAllWindows()
-            
+        labels = {user['id']: user['username'] for user in self.controller.db.get_all_users()}
+        self.worker = RecognitionWorker(self.controller.identifier,
+                                        self.controller.create_loop_analyzer(),
+                                        self.controller.spoofing_detector,
+                                        source=self.controller.open_frame_source(),
+                                        labels=labels,
+                                        stage_rates=self.controller.stage_rates)
+        self.worker.start()
+        poll_worker(self, self.worker, self.finish_recognition, self.status_var.set)
+    
+    def finish_recognition(self, result):
+        """Called on the Tk thread once the recognition worker has finished"""
+        user_id = self.controller.current_user['id']
+        if result['spoofing']:
             messagebox.showerror("Security Alert", "Spoofing attack detected! Photo/video presentation detected.")
             self.controller.db.log_spoofing_attempt(user_id)
-        elif recognized:
+        elif result['cancelled']:
+            return  # The user left the page
+        elif result['recognized'] and self.worker.labels is not None:
+            messagebox.showinfo("Success", f"Identified as {self.worker.labels[result['user_id']]}")
+        elif result['recognized']:
             messagebox.showinfo("Success", f"Face recognized successfully!")
         else:
             messagebox.showinfo("Result", "Face not recognized or verification failed")
+    
+    def cancel_recognition(self):
+        """Stop a running recognition, e.g. when leaving the page"""
+        if self.worker:
+            self.worker.cancel()
 
 if __name__ == "__main__":
-    app = FaceRecognitionApp()
+    parser = argparse.ArgumentParser(description="Face recognition system")
+    parser.add_argument('--source', default="0",
+                        help="camera index, video file, image directory or synthetic[:image] (default: camera 0)")
+    parser.add_argument('--max-speed', action='store_true',
+                        help="play recordings back as fast as possible instead of in real time")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="serve timing histograms on http://127.0.0.1:PORT/metrics")
+    parser.add_argument('--metrics-log', type=float, default=None, metavar='SECONDS',
+                        help="print timing percentiles every SECONDS")
+    args = parser.parse_args()
+    
+    # Instrumentation costs next to nothing until it is enabled here
+    if args.metrics_port is not None or args.metrics_log:
+        metrics.enable()
+    if args.metrics_port is not None:
+        MetricsServer(args.metrics_port).start()
+    if args.metrics_log:
+        MetricsLogger(args.metrics_log).start()
+    app = FaceRecognitionApp(args.source, realtime_playback=not args.max_speed)
     app.mainloop()
\ No newline at end of file
@@ -0,0 +1,294 @@
+"""
+Headless enrollment and training, for loading a whole roster at once.
+
+A roster directory holds one entry per user, named after the username:
+
+    roster/
+        alice/          a folder of face photos (any format cv2 can read)
+        bob.mp4         or a video of the user's face
+
+Faces are detected with the Haar cascade and filtered by the same
+EnrollmentSampler as the Capture page (largest face only, no blurred or
+near-duplicate crops). Users are imported in parallel processes, then every
+classifier is trained in parallel by a TrainingService and the shared
+identification model is synced once at the end. Throughput is printed for
+each phase, so a roster run doubles as a scaling benchmark.
+
+Usage:
+    python batch_enroll.py import roster/ --password changeme --train
+    python batch_enroll.py train                  # every user with images
+    python batch_enroll.py train alice bob --full
+    python batch_enroll.py rebuild                # drop deleted users from the identification model
+    python batch_enroll.py --image-format raw convert --vacuum
+    python batch_enroll.py --image-store images/ store --vacuum
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from camera import open_frame_source
+from database import FaceRecognitionDB
+from enrollment import EnrollmentSampler, capture_faces
+from face_codec import IMAGE_FORMATS
+from frame_analysis import TrackingFrameAnalyzer
+from identification import FaceIdentifier
+from training_service import TrainingService
+
+VIDEO_EXTENSIONS = ('.avi', '.mkv', '.mov', '.mp4', '.mpg', '.webm')
+
+def find_roster(root):
+    """List (username, path) for each user folder or video file in root; a username is only used once"""
+    entries = {}
+    for name in sorted(os.listdir(root)):
+        path = os.path.join(root, name)
+        username, extension = os.path.splitext(name)
+        if os.path.isdir(path):
+            username = name
+        elif extension.lower() not in VIDEO_EXTENSIONS:
+            continue
+        if username in entries:
+            print(f"Skipping {path}: {username} is already imported from {entries[username]}")
+            continue
+        entries[username] = path
+    return list(entries.items())
+
+# Per-process state, set up once by _init_worker in each pool process
+_worker_db = None
+
+def _init_worker(db_name, db_options):
+    global _worker_db
+    _worker_db = FaceRecognitionDB(db_name, **db_options)
+
+def import_user(username, path, password, max_images=100, frame_step=1):
+    """
+    Runs in a pool process: detect, filter and store one user's faces
+
+    Returns:
+        dict: username, user_id, created, frames, saved, no_face, sampler
+              stats and seconds; user_id is None (with an error) if the
+              user could not be created
+    """
+    start = time.perf_counter()
+    db = _worker_db
+    result = {'username': username, 'user_id': None, 'created': False, 'frames': 0,
+              'saved': 0, 'no_face': 0, 'error': None}
+
+    user_id = db.get_user_id(username)
+    if user_id is None:
+        if password is None:
+            result['error'] = "new user, but no --password given"
+            return result
+        user_id = db.add_user(username, password)
+        if user_id is None:
+            result['error'] = "could not create user"
+            return result
+        result['created'] = True
+    result['user_id'] = user_id
+
+    # Photos are unrelated to each other, so every one gets a full (downscaled) detection;
+    # video frames are tracked like the live camera loops
+    if os.path.isdir(path):
+        analyzer = TrackingFrameAnalyzer(detect_width=640, redetect_interval=0)
+    else:
+        analyzer = TrackingFrameAnalyzer()
+    sampler = EnrollmentSampler()
+
+    with open_frame_source(path, realtime=False) as source, db.face_image_writer(user_id) as writer:
+        stats = capture_faces(source, analyzer, sampler, writer, max_images, frame_step)
+    result['frames'] = stats['frames']
+    result['no_face'] = stats['no_face']
+
+    # Images that failed to encode or insert are not counted
+    result['saved'] = writer.saved
+    if writer.error:
+        result['error'] = f"saving images failed after {writer.saved}: {writer.error}"
+    result.update(sampler.get_stats())
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def import_roster(db, entries, password, max_images=100, frame_step=1, workers=None):
+    """Import every (username, path) in parallel processes; returns the per-user results"""
+    context = multiprocessing.get_context('spawn')
+    db_options = {
+        'image_format': db.image_format,
+        'image_store': db.image_store.root if db.image_store else None
+    }
+    results = []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=context,
+                             initializer=_init_worker, initargs=(db.db_name, db_options)) as executor:
+        futures = [
+            executor.submit(import_user, username, path, password, max_images, frame_step)
+            for username, path in entries
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if result['error']:
+                print(f"  {result['username']}: {'failed' if result['user_id'] else 'skipped'} ({result['error']})")
+            else:
+                print(f"  {result['username']}: {result['saved']} images from {result['frames']} frames "
+                      f"({result['duplicate']} duplicate, {result['blurry']} blurry, "
+                      f"{result['no_face']} without a face) in {result['seconds']:.1f} s"
+                      f"{'' if result['created'] else ' [existing user]'}")
+    return results
+
+def train_users(db, user_ids, incremental=True, workers=None):
+    """Train the given users in parallel and sync the identification model; returns the results"""
+    service = TrainingService(db, max_workers=workers)
+    usernames = {user['id']: user['username'] for user in db.get_all_users()}
+    results = {}
+    try:
+        pending = set()
+        for user_id in dict.fromkeys(user_ids):
+            if service.submit(user_id, incremental):
+                pending.add(user_id)
+            else:
+                print(f"  {usernames[user_id]}: could not be queued")
+        while pending:
+            # Checked before polling: once a job is no longer queued, its 'done' event is already waiting
+            idle = not any(service.is_queued(user_id) for user_id in pending)
+            for event in service.poll():
+                if event[0] != 'done':
+                    continue
+                _, user_id, result = event
+                pending.discard(user_id)
+                results[user_id] = result
+                if result['error']:
+                    print(f"  {usernames[user_id]}: failed ({result['error']})")
+                elif not result['saved']:
+                    print(f"  {usernames[user_id]}: nothing to train")
+                elif result['new_images']:
+                    print(f"  {usernames[user_id]}: {result['new_images']} new images, "
+                          f"{result['image_count']} total")
+                else:
+                    print(f"  {usernames[user_id]}: already up to date")
+            if idle and pending:
+                for user_id in pending:
+                    print(f"  {usernames[user_id]}: finished without a result")
+                break
+            time.sleep(0.05)
+    finally:
+        service.shutdown()
+
+    # One sync for the whole batch instead of one per user
+    start = time.perf_counter()
+    synced = FaceIdentifier(db).sync()
+    print(f"  identification model: {synced} images added in {time.perf_counter() - start:.1f} s")
+    return results
+
+def vacuum(db):
+    """VACUUM the database, printing how much the file shrank"""
+    # WAL mode: pages only reach (or leave) the main file at a checkpoint
+    db.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    before = os.path.getsize(db.db_name)
+    db.conn.execute("VACUUM")
+    db.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    after = os.path.getsize(db.db_name)
+    print(f"Vacuum: {before / 2**20:.1f} MB -> {after / 2**20:.1f} MB")
+
+def print_throughput(phase, users, images, seconds):
+    seconds = max(seconds, 1e-9)
+    print(f"{phase}: {users} users, {images} images in {seconds:.1f} s "
+          f"({images / seconds:.1f} images/s, {users / seconds:.2f} users/s)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default="face_recognition.db", help="database file")
+    parser.add_argument('--image-format', default='png', choices=IMAGE_FORMATS, help="storage format for new images")
+    parser.add_argument('--image-store', default=None, help="keep image bytes in this directory instead of SQLite")
+    parser.add_argument('--workers', type=int, default=None, help="parallel processes (default: one per core)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = commands.add_parser('import', help="enroll users from a roster directory")
+    import_parser.add_argument('roster', help="directory of <username>/ image folders and <username>.<ext> videos")
+    import_parser.add_argument('--password', default=None, help="initial password for users that do not exist yet")
+    import_parser.add_argument('--max-images', type=int, default=100, help="images to keep per user (0: no limit)")
+    import_parser.add_argument('--frame-step', type=int, default=1, help="use every Nth video frame")
+    import_parser.add_argument('--train', action='store_true', help="train the imported users afterwards")
+
+    train_parser = commands.add_parser('train', help="train user classifiers")
+    train_parser.add_argument('usernames', nargs='*', help="users to train (default: every user with images)")
+    train_parser.add_argument('--full', action='store_true', help="retrain from scratch instead of incrementally")
+
+    commands.add_parser('rebuild', help="retrain the identification model from every stored image")
+
+    convert_parser = commands.add_parser('convert', help="re-encode stored face images in --image-format")
+    convert_parser.add_argument('--vacuum', action='store_true', help="VACUUM afterwards to shrink the file")
+
+    store_parser = commands.add_parser('store', help="move image bytes into --image-store and prune unused files")
+    store_parser.add_argument('--vacuum', action='store_true', help="VACUUM afterwards to shrink the file")
+    args = parser.parse_args()
+    if args.command == 'store' and not args.image_store:
+        parser.error("store needs --image-store")
+
+    db = FaceRecognitionDB(args.db, image_format=args.image_format, image_store=args.image_store)
+    try:
+        if args.command == 'rebuild':
+            info = db.get_identification_model_info()
+            removed = len(info['removed_user_ids']) if info else 0
+            print(f"Rebuilding the identification model ({removed} deleted users to drop)")
+            start = time.perf_counter()
+            images = FaceIdentifier(db).rebuild()
+            seconds = max(time.perf_counter() - start, 1e-9)
+            print(f"Rebuild: {images} images in {seconds:.1f} s ({images / seconds:.1f} images/s)")
+            return
+        if args.command == 'convert':
+            print(f"Converting face images to {args.image_format}")
+            start = time.perf_counter()
+            images = db.convert_face_images(args.image_format)
+            seconds = max(time.perf_counter() - start, 1e-9)
+            print(f"Convert: {images} images in {seconds:.1f} s ({images / seconds:.1f} images/s)")
+            if args.vacuum:
+                vacuum(db)
+            return
+        if args.command == 'store':
+            print(f"Moving face images into {args.image_store}")
+            start = time.perf_counter()
+            images = db.move_face_images_to_store()
+            seconds = max(time.perf_counter() - start, 1e-9)
+            print(f"Store: {images} images in {seconds:.1f} s ({images / seconds:.1f} images/s), "
+                  f"{db.prune_image_store()} unused files pruned")
+            if args.vacuum:
+                vacuum(db)
+            return
+        if args.command == 'import':
+            entries = find_roster(args.roster)
+            if not entries:
+                sys.exit(f"No user folders or videos found in {args.roster}")
+            print(f"Importing {len(entries)} users from {args.roster}")
+            start = time.perf_counter()
+            results = import_roster(db, entries, args.password, args.max_images, args.frame_step, args.workers)
+            imported = [result for result in results if not result['error']]
+            print_throughput("Import", len(imported), sum(result['saved'] for result in imported),
+                             time.perf_counter() - start)
+            user_ids = [result['user_id'] for result in imported]
+            incremental = True
+            if not args.train:
+                return
+        else:
+            users = {user['username']: user['id'] for user in db.get_all_users()}
+            missing = [username for username in args.usernames if username not in users]
+            if missing:
+                sys.exit(f"Unknown users: {', '.join(missing)}")
+            if args.usernames:
+                user_ids = [users[username] for username in dict.fromkeys(args.usernames)]
+            else:
+                user_ids = [user_id for user_id in users.values() if db.get_face_image_count(user_id)]
+            incremental = not args.full
+
+        if not user_ids:
+            sys.exit("No users to train")
+        print(f"Training {len(user_ids)} users")
+        start = time.perf_counter()
+        results = train_users(db, user_ids, incremental, args.workers)
+        trained = [result for result in results.values() if result.get('saved')]
+        print_throughput("Training", len(trained), sum(result['new_images'] for result in trained),
+                         time.perf_counter() - start)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark full-resolution face detection against downscaled, ROI-tracked detection.
+
+Usage:
+    python benchmarks/bench_detection.py recording.avi
+    python benchmarks/bench_detection.py face.jpg --frames 300 --width 1280
+
+A video file, image directory or synthetic source (see open_frame_source)
+is replayed as recorded. A still image is turned into a clip by shifting it
+a few pixels per frame, to simulate a subject moving slightly.
+"""
+import argparse
+import os
+import sys
+from time import perf_counter
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from camera import open_frame_source
+from frame_analysis import FrameAnalyzer, TrackingFrameAnalyzer
+
+def load_frames(path, count, width):
+    """Load up to count frames into memory, resized to the given width"""
+    frames = []
+    image = cv2.imread(path) if os.path.isfile(path) else None
+    if image is not None:
+        for i in range(count):
+            dx, dy = int(8 * np.sin(i / 10)), int(4 * np.cos(i / 15))
+            frames.append(np.roll(image, (dy, dx), axis=(0, 1)))
+    else:
+        with open_frame_source(path, realtime=False) as source:
+            while len(frames) < count:
+                ret, frame = source.read()
+                if not ret:
+                    break
+                frames.append(frame)
+
+    if width:
+        frames = [cv2.resize(f, (width, int(f.shape[0] * width / f.shape[1]))) for f in frames]
+    return frames
+
+def run(analyzer, frames):
+    """Analyse every frame; returns (seconds, frames with a face)"""
+    found = 0
+    start = perf_counter()
+    for frame in frames:
+        if len(analyzer.analyze(frame).faces) > 0:
+            found += 1
+    return perf_counter() - start, found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', help="video file, image directory, synthetic:<image> or still image containing a face")
+    parser.add_argument('--frames', type=int, default=300, help="number of frames to process")
+    parser.add_argument('--width', type=int, default=None, help="resize frames to this width first")
+    parser.add_argument('--detect-width', type=int, default=320, help="width used for downscaled detection")
+    parser.add_argument('--redetect', type=int, default=10, help="frames between full re-detects")
+    args = parser.parse_args()
+
+    frames = load_frames(args.source, args.frames, args.width)
+    if not frames:
+        sys.exit(f"Could not read frames from {args.source}")
+    height, width = frames[0].shape[:2]
+    print(f"{len(frames)} frames at {width}x{height}")
+
+    baseline = FrameAnalyzer()
+    tracking = TrackingFrameAnalyzer(detect_width=args.detect_width, redetect_interval=args.redetect)
+
+    for name, analyzer in (("full-frame", baseline), ("tracked", tracking)):
+        elapsed, found = run(analyzer, frames)
+        print(f"{name:>10}: {len(frames) / elapsed:8.1f} detections/s "
+              f"({elapsed * 1000 / len(frames):.2f} ms/frame, face found in {found}/{len(frames)} frames)")
+
+    print(f"tracking stats: {tracking.get_stats()}")
+
+if __name__ == "__main__":
+    main()
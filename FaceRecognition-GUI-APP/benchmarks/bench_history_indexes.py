@@ -0,0 +1,113 @@
+"""
+Show the effect of the schema-migration indexes on the hot database queries.
+
+Builds a throwaway database with a synthetic login history (1M rows by
+default) and face_images table, drops the indexes to get the old schema,
+then prints the query plan and timing of each access path before and after
+FaceRecognitionDB.migrate() recreates them.
+
+Usage:
+    python benchmarks/bench_history_indexes.py --rows 1000000 --users 1000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import FaceRecognitionDB, MIGRATIONS
+
+def build(db, users, history_rows, image_rows):
+    """Fill the database with synthetic users, logins and tiny face image blobs"""
+    cursor = db.cursor
+    cursor.executemany(
+        "INSERT INTO users (username, password_hash) VALUES (?, 'x')",
+        ((f"user{i}",) for i in range(users))
+    )
+    user_ids = [row[0] for row in cursor.execute("SELECT id FROM users")]
+
+    rng = random.Random(0)
+    cursor.executemany(
+        "INSERT INTO login_history (user_id, login_time, success) "
+        "VALUES (?, datetime('2024-01-01', ? || ' seconds'), ?)",
+        ((rng.choice(user_ids), i * 7, rng.random() < 0.9) for i in range(history_rows))
+    )
+    cursor.executemany(
+        "INSERT INTO face_images (user_id, image_data, capture_time) "
+        "VALUES (?, x'00', datetime('2024-01-01', ? || ' seconds'))",
+        ((rng.choice(user_ids), i) for i in range(image_rows))
+    )
+    db.conn.commit()
+    return user_ids
+
+def drop_indexes(db):
+    """Return the database to the pre-migration schema"""
+    for (name,) in db.cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'").fetchall():
+        db.cursor.execute(f"DROP INDEX {name}")
+    db.cursor.execute("PRAGMA user_version = 0")
+    db.conn.commit()
+
+def plan(db, query, params):
+    rows = db.cursor.execute("EXPLAIN QUERY PLAN " + query, params).fetchall()
+    return "; ".join(row[-1] for row in rows)
+
+def time_call(fn, repeat):
+    start = perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (perf_counter() - start) * 1000 / repeat
+
+def report(db, user_id, repeat):
+    history_query = ("SELECT u.username, l.login_time FROM login_history l JOIN users u ON l.user_id = u.id "
+                     "ORDER BY l.login_time DESC LIMIT ?")
+    user_history_query = ("SELECT u.username, l.login_time FROM login_history l JOIN users u ON l.user_id = u.id "
+                          "WHERE l.user_id = ? ORDER BY l.login_time DESC LIMIT ?")
+    checks = [
+        ("get_login_history()", history_query, (100,),
+         lambda: db.get_login_history(limit=100)),
+        ("get_login_history(user_id)", user_history_query, (user_id, 100),
+         lambda: db.get_login_history(user_id=user_id, limit=100)),
+        ("get_face_image_count", "SELECT COUNT(*) FROM face_images WHERE user_id = ?", (user_id,),
+         lambda: db.get_face_image_count(user_id)),
+        ("face_images by user/time",
+         "SELECT image_data FROM face_images WHERE user_id = ? ORDER BY capture_time DESC", (user_id,),
+         lambda: db.cursor.execute(
+             "SELECT image_data FROM face_images WHERE user_id = ? ORDER BY capture_time DESC",
+             (user_id,)).fetchall()),
+    ]
+    for name, query, params, fn in checks:
+        print(f"  {name:<28} {time_call(fn, repeat):9.2f} ms   plan: {plan(db, query, params)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000, help="login_history rows")
+    parser.add_argument('--images', type=int, default=300000, help="face_images rows")
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = FaceRecognitionDB(os.path.join(tmp, "bench.db"))
+        start = perf_counter()
+        user_ids = build(db, args.users, args.rows, args.images)
+        print(f"Built {args.rows} logins, {args.images} images for {args.users} users "
+              f"in {perf_counter() - start:.1f}s")
+        user_id = user_ids[len(user_ids) // 2]
+
+        drop_indexes(db)
+        print(f"\nBefore migrations (schema version {db.get_schema_version()}):")
+        report(db, user_id, args.repeat)
+
+        start = perf_counter()
+        db.migrate()
+        db.cursor.execute("ANALYZE")
+        print(f"\nAfter migrations (schema version {db.get_schema_version()} of {MIGRATIONS[-1][0]}, "
+              f"applied in {perf_counter() - start:.1f}s):")
+        report(db, user_id, args.repeat)
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Compare face image storage formats: database size and decode time.
+
+Fills a throwaway database with face crops in the original format (BGR
+JPEG at whatever size the face was detected), then converts it in place
+with FaceRecognitionDB.convert_face_images() to each normalized grayscale
+format. After every conversion the database is VACUUMed and the file size,
+the time to decode all images for training and the conversion time are
+printed.
+
+Usage:
+    python benchmarks/bench_image_format.py --images 3000
+    python benchmarks/bench_image_format.py --image face.jpg --images 3000
+"""
+import argparse
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_training import synthetic_crops
+from database import FaceRecognitionDB
+from face_codec import encode_face_image
+from training import decode_face
+
+def decode_all(db):
+    """Decode every stored image to a training face; returns (seconds, images)"""
+    count = 0
+    start = perf_counter()
+    for rows in db.iter_face_image_rows():
+        for row in rows:
+            if decode_face(row[2], row[3]) is not None:
+                count += 1
+    return perf_counter() - start, count
+
+def report(db, path, label, convert_seconds=None):
+    db.conn.execute("VACUUM")
+    db.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    size = os.path.getsize(path)
+    seconds, count = decode_all(db)
+    converted = f"{convert_seconds:>10.2f}" if convert_seconds is not None else f"{'-':>10}"
+    print(f"{label:>7} {size / 1024 / 1024:>9.1f} {size / count / 1024:>9.1f} "
+          f"{seconds * 1e6 / count:>10.0f} {converted}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=3000)
+    parser.add_argument('--image', help="image to cut synthetic face crops from")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        db = FaceRecognitionDB(path, image_format='jpeg')
+        user_id = db.add_user("bench", "bench")
+        rows = [(user_id, encode_face_image(crop, 'jpeg')) for crop in synthetic_crops(args.images, args.image)]
+        db.save_encoded_face_images(rows, 'jpeg')
+        del rows
+
+        print(f"{'format':>7} {'DB MB':>9} {'KB/image':>9} {'decode us':>10} {'convert s':>10}")
+        report(db, path, 'jpeg')
+        for image_format in ('png', 'raw'):
+            start = perf_counter()
+            db.convert_face_images(image_format)
+            report(db, path, image_format, perf_counter() - start)
+        db.close()
+
+if __name__ == "__main__":
+    main()
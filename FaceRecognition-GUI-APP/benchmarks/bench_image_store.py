@@ -0,0 +1,79 @@
+"""
+Compare keeping face images as SQLite BLOBs with the file image store.
+
+Builds a database with face images in the BLOB column, measures it, then
+moves the images into a FileImageStore with move_face_images_to_store()
+and measures again. For each layout this prints the database file size,
+the time to VACUUM it and to copy it with the SQLite backup API (the work
+every backup repeats), and the time to read all image bytes for training.
+
+Usage:
+    python benchmarks/bench_image_store.py --images 3000
+    python benchmarks/bench_image_store.py --image face.jpg --format raw
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_training import synthetic_crops
+from database import FaceRecognitionDB
+from face_codec import IMAGE_FORMATS, encode_face_image
+
+def timed(fn):
+    start = perf_counter()
+    fn()
+    return perf_counter() - start
+
+def read_all(db):
+    for rows in db.iter_face_image_rows():
+        for row in rows:
+            assert row[2]
+
+def backup(path, target):
+    source = sqlite3.connect(path)
+    dest = sqlite3.connect(target)
+    source.backup(dest)
+    dest.close()
+    source.close()
+    os.unlink(target)
+
+def report(db, path, label):
+    vacuum = timed(lambda: db.conn.execute("VACUUM"))
+    db.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    size = os.path.getsize(path)
+    backup_time = timed(lambda: backup(path, path + ".bak"))
+    read = timed(lambda: read_all(db))
+    store = db.image_store.get_stats()['bytes'] if db.image_store else 0
+    print(f"{label:>6} {size / 1024 / 1024:>8.1f} {store / 1024 / 1024:>9.1f} "
+          f"{vacuum * 1000:>10.0f} {backup_time * 1000:>10.0f} {read * 1000:>8.0f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=3000)
+    parser.add_argument('--image', help="image to cut synthetic face crops from")
+    parser.add_argument('--format', default='png', choices=IMAGE_FORMATS, help="storage format of the images")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        db = FaceRecognitionDB(path, image_format=args.format)
+        user_id = db.add_user("bench", "bench")
+        rows = [(user_id, encode_face_image(crop, args.format)) for crop in synthetic_crops(args.images, args.image)]
+        db.save_encoded_face_images(rows)
+        del rows
+
+        print(f"{'layout':>6} {'DB MB':>8} {'files MB':>9} {'vacuum ms':>10} {'backup ms':>10} {'read ms':>8}")
+        report(db, path, 'blob')
+        db.close()
+
+        db = FaceRecognitionDB(path, image_format=args.format, image_store=os.path.join(tmp, "images"))
+        db.move_face_images_to_store()
+        report(db, path, 'files')
+        db.close()
+
+if __name__ == "__main__":
+    main()
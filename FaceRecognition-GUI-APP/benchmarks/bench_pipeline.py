@@ -0,0 +1,175 @@
+"""
+End-to-end throughput and latency of the login and recognition camera loops.
+
+Replays a frame source (see open_frame_source) through the real
+VerificationWorker or RecognitionWorker, with the Tk side replaced by a loop
+that waits for the worker's 'done' message, and reports:
+
+    fps       frames the loop processed per second of wall time
+    latency   from read() returning a frame to its annotated copy being
+              posted for display (mean and max)
+    dropped   frames the source overwrote before the loop read them
+              (real-time playback only)
+
+plus the per-stage timings from the worker's StageScheduler. The loop's
+time limits are lifted, so it runs until the source ends (or --frames).
+
+Stage rates are in wall-clock time, so at max speed they would skip almost
+every detection. Max-speed runs therefore run every stage on every frame
+(the cost of the full pipeline) unless --scheduled is given; real-time runs
+use DEFAULT_STAGE_RATES, as in the GUI.
+
+The classifier is loaded from a database (--db and --user), or trained on
+the fly on the largest face in the first --train-frames frames.
+
+Usage:
+    python benchmarks/bench_pipeline.py recording.avi
+    python benchmarks/bench_pipeline.py synthetic:face.jpg --realtime
+    python benchmarks/bench_pipeline.py sessions/ --loop verification --db face_recognition.db --user alice
+"""
+import argparse
+import os
+import sys
+from time import perf_counter
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from camera import open_frame_source
+from enrollment import largest_face
+from face_codec import preprocess_face
+from frame_analysis import FrameAnalyzer, TrackingFrameAnalyzer
+from scheduler import DEFAULT_STAGE_RATES
+from spoofing_detection import SpoofingDetector
+from workers import RecognitionWorker, VerificationWorker
+
+def train_from_source(spec, frames):
+    """Throwaway LBPH classifier (label 0) from the largest face in the first frames of spec"""
+    analyzer = FrameAnalyzer()
+    faces = []
+    with open_frame_source(spec, realtime=False) as source:
+        for _ in range(frames):
+            ret, frame = source.read()
+            if not ret:
+                break
+            analysis = analyzer.analyze(frame)
+            box = largest_face(analysis.faces)
+            if box is not None:
+                x, y, w, h = box
+                faces.append(preprocess_face(analysis.gray[y:y+h, x:x+w]))
+    if not faces:
+        sys.exit("No faces found to train on; pass --db and --user")
+    classifier = cv2.face.LBPHFaceRecognizer_create()
+    classifier.train(faces, np.zeros(len(faces), dtype=np.int32))
+    return classifier
+
+def load_classifier(db_name, username):
+    from database import FaceRecognitionDB
+    db = FaceRecognitionDB(db_name)
+    try:
+        user_id = db.get_user_id(username)
+        classifier = db.get_classifier(user_id) if user_id is not None else None
+    finally:
+        db.close()
+    if classifier is None:
+        sys.exit(f"No trained classifier for {username} in {db_name}")
+    return classifier
+
+def run_pipeline(worker, source, max_frames=None):
+    """
+    Run a worker over an unstarted source until it finishes
+
+    Returns:
+        dict: frames, seconds, latencies (seconds per displayed frame) and
+              the worker's final result
+    """
+    read_times = {}
+    latencies = []
+
+    # Time each frame from the moment the loop gets it to the moment it is posted for display
+    read = source.read
+    def timed_read(timeout=2.0):
+        ret, frame = read(timeout)
+        if ret:
+            read_times[id(frame)] = perf_counter()
+        return ret, frame
+    source.read = timed_read
+
+    def timed_show(frame):
+        read_time = read_times.pop(id(frame), None)
+        if read_time is not None:
+            latencies.append(perf_counter() - read_time)
+        if max_frames and len(latencies) >= max_frames:
+            worker.cancel()
+    worker.show = timed_show
+    worker.source = source
+
+    start = perf_counter()
+    worker.start()
+    while True:
+        kind, value = worker.messages.get()
+        if kind == 'done':
+            break
+    worker.join()
+    seconds = perf_counter() - start
+    return {'frames': len(latencies), 'seconds': seconds, 'latencies': latencies,
+            'source': source.get_stats(), 'result': value}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', help="video file, image directory, synthetic[:image] or camera index")
+    parser.add_argument('--loop', choices=('recognition', 'verification'), default='recognition')
+    parser.add_argument('--realtime', action='store_true', help="play back at the recording's frame rate")
+    parser.add_argument('--scheduled', action='store_true',
+                        help="keep DEFAULT_STAGE_RATES at max speed instead of running every stage per frame")
+    parser.add_argument('--frames', type=int, default=None, help="stop after this many frames")
+    parser.add_argument('--no-tracking', action='store_true', help="full-frame detection on every detect")
+    parser.add_argument('--db', default=None, help="database to load the classifier from")
+    parser.add_argument('--user', default=None, help="user whose classifier to load (with --db)")
+    parser.add_argument('--train-frames', type=int, default=50,
+                        help="frames to train a throwaway classifier on when no --db is given")
+    args = parser.parse_args()
+
+    if args.db:
+        if not args.user:
+            sys.exit("--db needs --user")
+        classifier = load_classifier(args.db, args.user)
+    else:
+        classifier = train_from_source(args.source, args.train_frames)
+
+    frame_analyzer = FrameAnalyzer()
+    analyzer = frame_analyzer if args.no_tracking else TrackingFrameAnalyzer(frame_analyzer.face_cascade)
+    spoofing_detector = SpoofingDetector(frame_analyzer)
+    scheduled = args.realtime or args.scheduled
+    stage_rates = DEFAULT_STAGE_RATES if scheduled else {name: None for name in DEFAULT_STAGE_RATES}
+    if args.loop == 'verification':
+        worker = VerificationWorker(args.user or "user", classifier, analyzer, spoofing_detector,
+                                    stage_rates=stage_rates)
+        worker.min_verification_time = float('inf')
+    else:
+        worker = RecognitionWorker(classifier, analyzer, spoofing_detector, stage_rates=stage_rates)
+        worker.min_recognition_time = float('inf')
+    # Run until the source ends rather than stopping on a decision or timeout
+    worker.min_spoofing_time = float('inf')
+    worker.max_timeout = float('inf')
+
+    source = open_frame_source(args.source, realtime=args.realtime)
+    stats = run_pipeline(worker, source, args.frames)
+    if not stats['frames']:
+        sys.exit(f"No frames processed ({stats['result']['error'] or 'source could not be opened'})")
+
+    latencies_ms = np.array(stats['latencies']) * 1000
+    print(f"{args.loop} loop, {'real-time' if args.realtime else 'max-speed'} playback, "
+          f"{'full-frame' if args.no_tracking else 'tracked'} detection, "
+          f"{'scheduled stages' if scheduled else 'every stage on every frame'}")
+    print(f"     frames: {stats['frames']} in {stats['seconds']:.2f} s "
+          f"({stats['frames'] / stats['seconds']:.1f} fps)")
+    print(f"    latency: {latencies_ms.mean():.1f} ms mean, {latencies_ms.max():.1f} ms max")
+    print(f"    dropped: {stats['source']['frames_dropped']} of {stats['source']['frames_captured']} source frames")
+    for name, stage in stats['result']['stages'].items():
+        print(f"{name:>11}: {stage['runs']} runs, {stage['skips']} skipped, "
+              f"{stage['avg_ms']:.2f} ms avg, {stage['max_ms']:.2f} ms max")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+End-to-end benchmark suite for the login, recognition, capture and training flows.
+
+For each database scale (every --users x --images pair) a throwaway database
+is built with one probe user, who has --images face images and a trained
+classifier, plus users-1 background users with --background-images images
+each. The users and face_images tables grow with the user count without the
+database growing to users x images rows (100k users x 30k images would be
+billions of rows). Each flow then runs in a fresh subprocess on the same
+recorded frames (--source, see open_frame_source), so peak RSS is per flow:
+
+    login        attempt_login: verify_user, get_classifier (cold cache),
+                 then the VerificationWorker loop until the source ends
+    recognition  get_classifier, then the RecognitionWorker loop
+    capture      the Capture page loop (capture_faces) into a FaceImageWriter
+    training     train_user_classifier() from scratch on the probe user
+
+For every stage it reports p50/p95/p99/mean/max latency in ms. The camera
+loop stages are detect, liveness (the spoofing check), predict and display
+(annotating and posting the frame; the cv2.imshow call on the Tk thread is
+not included), plus frame (read to display). It also reports frames (or
+images) per second and peak RSS. Loop stages run on every frame, as in
+bench_pipeline.py at max speed. Results are printed and can be written as
+JSON (--json); --compare prints the change between two JSON files, e.g.
+from before and after a change.
+
+Usage:
+    python benchmarks/bench_suite.py --source recording.avi --json before.json
+    python benchmarks/bench_suite.py --source synthetic:face.jpg --users 10 1000 100000 --images 300 3000 30000
+    python benchmarks/bench_suite.py --compare before.json after.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from hashlib import sha256
+from time import perf_counter
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import cv2
+import numpy as np
+from bench_pipeline import run_pipeline
+from bench_training import synthetic_crops
+from camera import open_frame_source
+from database import FaceRecognitionDB
+from face_codec import IMAGE_FORMATS, encode_face_image
+from scheduler import DEFAULT_STAGE_RATES, StageScheduler
+
+FLOWS = ('login', 'recognition', 'capture', 'training')
+PROBE_USER = "probe"
+
+class SampledScheduler(StageScheduler):
+    """StageScheduler that also keeps every call time, for percentiles"""
+    def __init__(self, rates=None):
+        super().__init__(rates)
+        self.samples = defaultdict(list)
+
+    def run(self, name, fn, *args):
+        def timed(*args):
+            start = perf_counter()
+            result = fn(*args)
+            self.samples[name].append(perf_counter() - start)
+            return result
+        return super().run(name, timed, *args)
+
+def time_calls(obj, method, samples):
+    """Record the duration of every call to obj.method in samples"""
+    fn = getattr(obj, method)
+    def timed(*args, **kwargs):
+        start = perf_counter()
+        result = fn(*args, **kwargs)
+        samples.append(perf_counter() - start)
+        return result
+    setattr(obj, method, timed)
+
+def summarize(samples):
+    """Latency percentiles in ms for a list of durations in seconds"""
+    ms = np.array(samples) * 1000
+    return {
+        'count': len(ms),
+        'p50': float(np.percentile(ms, 50)),
+        'p95': float(np.percentile(ms, 95)),
+        'p99': float(np.percentile(ms, 99)),
+        'mean': float(ms.mean()),
+        'max': float(ms.max())
+    }
+
+def build(path, users, images, background_images, image_format, image_path):
+    """Fill a database for one scale; returns the probe user's id"""
+    from training import train_user_classifier
+    db = FaceRecognitionDB(path, image_format=image_format)
+    probe_id = db.add_user(PROBE_USER, PROBE_USER)
+
+    # A pool of encoded crops is reused for every row, so building stays cheap
+    pool = [encode_face_image(crop, image_format) for crop in synthetic_crops(min(images, 500), image_path)]
+
+    def insert_images(user_ids, count):
+        chunk = []
+        for user_id in user_ids:
+            for i in range(count):
+                chunk.append((user_id, pool[i % len(pool)]))
+                if len(chunk) == 5000:
+                    db.save_encoded_face_images(chunk)
+                    chunk = []
+        if chunk:
+            db.save_encoded_face_images(chunk)
+
+    insert_images([probe_id], images)
+    password_hash = sha256(b"bench").hexdigest()
+    db.cursor.executemany(
+        "INSERT INTO users (username, password_hash, is_admin) VALUES (?, ?, 0)",
+        ((f"user{i:06d}", password_hash) for i in range(users - 1))
+    )
+    db.conn.commit()
+    db.cursor.execute("SELECT id FROM users WHERE username LIKE 'user%'")
+    insert_images([row[0] for row in db.cursor.fetchall()], background_images)
+
+    train_user_classifier(db, probe_id, incremental=False)
+    db.close()
+    return probe_id
+
+def run_loop_flow(flow, db, user_id, source_spec, max_frames):
+    """Login or recognition: look up the classifier, then run the worker loop over the source"""
+    from frame_analysis import FrameAnalyzer, TrackingFrameAnalyzer
+    from spoofing_detection import SpoofingDetector
+    from workers import RecognitionWorker, VerificationWorker
+
+    samples = defaultdict(list)
+    start = perf_counter()
+    if flow == 'login':
+        time_calls(db, 'verify_user', samples['verify_user'])
+        if db.verify_user(PROBE_USER, PROBE_USER) is None:
+            raise RuntimeError("probe user failed to log in")
+    time_calls(db, 'get_classifier', samples['get_classifier'])
+    classifier = db.get_classifier(user_id)
+
+    frame_analyzer = FrameAnalyzer()
+    analyzer = TrackingFrameAnalyzer(frame_analyzer.face_cascade)
+    spoofing_detector = SpoofingDetector(frame_analyzer)
+    every_frame = {name: None for name in DEFAULT_STAGE_RATES}
+    if flow == 'login':
+        worker = VerificationWorker(PROBE_USER, classifier, analyzer, spoofing_detector)
+        worker.min_verification_time = float('inf')
+    else:
+        worker = RecognitionWorker(classifier, analyzer, spoofing_detector)
+        worker.min_recognition_time = float('inf')
+    worker.min_spoofing_time = float('inf')
+    worker.max_timeout = float('inf')
+    worker.schedule = SampledScheduler(every_frame)
+
+    stats = run_pipeline(worker, open_frame_source(source_spec, realtime=False), max_frames)
+    if stats['result']['error']:
+        raise RuntimeError(stats['result']['error'])
+    samples.update(worker.schedule.samples)
+    samples['frame'] = stats['latencies']
+    samples['decision'] = [perf_counter() - start]
+    return {'frames': stats['frames'], 'loop_seconds': stats['seconds'],
+            'fps': stats['frames'] / stats['seconds'] if stats['seconds'] else 0.0}, samples
+
+def run_capture_flow(db, user_id, source_spec, max_frames):
+    """The Capture page loop, with each step timed"""
+    from enrollment import EnrollmentSampler, capture_faces
+    from frame_analysis import TrackingFrameAnalyzer
+
+    samples = defaultdict(list)
+    analyzer = TrackingFrameAnalyzer()
+    sampler = EnrollmentSampler()
+    time_calls(analyzer, 'analyze', samples['detect'])
+    time_calls(sampler, 'offer', samples['sample'])
+
+    source = open_frame_source(source_spec, realtime=False).start()
+    read_time = [None]
+    read = source.read
+    def timed_read(timeout=2.0):
+        read_time[0] = perf_counter()
+        return read(timeout)
+    source.read = timed_read
+
+    def on_frame(frame, box, reason, count):
+        samples['frame'].append(perf_counter() - read_time[0])
+        return not max_frames or len(samples['frame']) < max_frames
+
+    start = perf_counter()
+    writer = db.face_image_writer(user_id)
+    time_calls(writer, 'add', samples['save'])
+    try:
+        # No image limit: the whole source is processed, like the other loop flows
+        stats = capture_faces(source, analyzer, sampler, writer, on_frame=on_frame)
+    finally:
+        flush_start = perf_counter()
+        writer.close()
+        samples['flush'].append(perf_counter() - flush_start)
+        source.release()
+    seconds = perf_counter() - start
+    return {'frames': stats['frames'], 'saved': writer.saved, 'loop_seconds': seconds,
+            'fps': stats['frames'] / seconds if seconds else 0.0}, samples
+
+def run_training_flow(db, user_id):
+    """Full retrain of the probe user's classifier; chunk is the time per on_progress step"""
+    from training import train_user_classifier
+
+    samples = defaultdict(list)
+    last = [perf_counter()]
+    def on_progress(done, total):
+        now = perf_counter()
+        samples['chunk'].append(now - last[0])
+        last[0] = now
+
+    start = perf_counter()
+    result = train_user_classifier(db, user_id, incremental=False, on_progress=on_progress)
+    seconds = perf_counter() - start
+    samples['train'] = [seconds]
+    return {'images': result['new_images'], 'loop_seconds': seconds,
+            'images_per_second': result['new_images'] / seconds if seconds else 0.0}, samples
+
+def child(flow, path, user_id, source_spec, max_frames):
+    """Run one flow and print its results as JSON"""
+    db = FaceRecognitionDB(path)
+    if flow in ('login', 'recognition'):
+        result, samples = run_loop_flow(flow, db, user_id, source_spec, max_frames)
+    elif flow == 'capture':
+        result, samples = run_capture_flow(db, user_id, source_spec, max_frames)
+    else:
+        result, samples = run_training_flow(db, user_id)
+    db.close()
+    result['stages'] = {name: summarize(values) for name, values in samples.items() if values}
+    result['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps(result))
+
+def print_flow(flow, result):
+    rate = (f"{result['fps']:.1f} fps" if 'fps' in result
+            else f"{result['images_per_second']:.0f} images/s")
+    print(f"  {flow}: {rate}, peak RSS {result['peak_rss_mb']:.0f} MB")
+    for name, stage in result['stages'].items():
+        print(f"    {name:>14}: p50 {stage['p50']:8.2f}  p95 {stage['p95']:8.2f}  p99 {stage['p99']:8.2f}  "
+              f"max {stage['max']:8.2f} ms  (n={stage['count']})")
+
+def compare(base_path, new_path):
+    """Print p95 and throughput changes between two result files"""
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    base_scales = {(scale['users'], scale['images']): scale for scale in base['scales']}
+
+    def change(old, value):
+        return f"{(value - old) / old * 100:+6.1f}%" if old else "   n/a"
+
+    for scale in new['scales']:
+        old_scale = base_scales.get((scale['users'], scale['images']))
+        if old_scale is None:
+            continue
+        print(f"{scale['users']} users x {scale['images']} images")
+        for flow, result in scale['flows'].items():
+            old = old_scale['flows'].get(flow)
+            if old is None:
+                continue
+            key = 'fps' if 'fps' in result else 'images_per_second'
+            print(f"  {flow}: {key} {old[key]:.1f} -> {result[key]:.1f} ({change(old[key], result[key])}), "
+                  f"peak RSS {old['peak_rss_mb']:.0f} -> {result['peak_rss_mb']:.0f} MB")
+            for name, stage in result['stages'].items():
+                if name in old['stages']:
+                    old_p95 = old['stages'][name]['p95']
+                    print(f"    {name:>14} p95: {old_p95:8.2f} -> {stage['p95']:8.2f} ms "
+                          f"({change(old_p95, stage['p95'])})")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', help="recorded frames: video file, image directory or synthetic:<image>")
+    parser.add_argument('--users', type=int, nargs='+', default=[10, 1000], help="user counts to build")
+    parser.add_argument('--images', type=int, nargs='+', default=[300, 3000],
+                        help="face images of the probe user")
+    parser.add_argument('--background-images', type=int, default=10, help="face images per background user")
+    parser.add_argument('--flows', nargs='+', choices=FLOWS, default=list(FLOWS))
+    parser.add_argument('--frames', type=int, default=None, help="stop each loop flow after this many frames")
+    parser.add_argument('--image', help="image to cut the stored face crops from")
+    parser.add_argument('--format', default='png', choices=IMAGE_FORMATS, help="storage format of the images")
+    parser.add_argument('--json', help="write the results to this file")
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help="compare two result files")
+    parser.add_argument('--child', nargs=3, metavar=('FLOW', 'DB', 'USER_ID'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.child:
+        flow, path, user_id = args.child
+        child(flow, path, int(user_id), args.source, args.frames)
+        return
+    if not args.source:
+        parser.error("--source is required")
+
+    results = {
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'cpu_count': os.cpu_count(),
+        'source': args.source,
+        'format': args.format,
+        'background_images': args.background_images,
+        'scales': []
+    }
+    for users in args.users:
+        for images in args.images:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "bench.db")
+                start = perf_counter()
+                user_id = build(path, users, images, args.background_images, args.format, args.image)
+                scale = {'users': users, 'images': images, 'build_seconds': perf_counter() - start,
+                         'db_mb': os.path.getsize(path) / 1e6, 'flows': {}}
+                print(f"{users} users x {images} images ({scale['db_mb']:.1f} MB, "
+                      f"built in {scale['build_seconds']:.1f} s)")
+
+                for flow in args.flows:
+                    cmd = [sys.executable, os.path.abspath(__file__), '--child', flow, path, str(user_id),
+                           '--source', args.source]
+                    if args.frames:
+                        cmd += ['--frames', str(args.frames)]
+                    out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+                    scale['flows'][flow] = json.loads(out.strip().splitlines()[-1])
+                    print_flow(flow, scale['flows'][flow])
+                results['scales'].append(scale)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json}")
+
+if __name__ == "__main__":
+    main()
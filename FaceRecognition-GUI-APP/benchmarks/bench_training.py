@@ -0,0 +1,112 @@
+"""
+Compare the old training data path with the streaming, parallel-decode pipeline.
+
+For each size a throwaway database is filled with synthetic JPEG face crops
+for one user. Each path then runs in a fresh subprocess so wall time and peak
+RSS are measured separately:
+
+    materialized  get_face_images() -> cvtColor loop -> classifier.train()
+    streaming     iter_training_batches() (chunked, thread-pool decode to
+                  grayscale, resized to FACE_SIZE) -> fit_lbph()
+
+Neither path saves the model, so only data loading and training are timed.
+
+Usage:
+    python benchmarks/bench_training.py --sizes 300 3000 30000
+    python benchmarks/bench_training.py --image face.jpg --sizes 300 3000
+    python benchmarks/bench_training.py --format png
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import cv2
+import numpy as np
+from database import FaceRecognitionDB
+from face_codec import IMAGE_FORMATS, encode_face_image
+
+def synthetic_crops(count, image_path=None, seed=0):
+    """Yield BGR face crops of varying size, cut from image_path or generated"""
+    rng = np.random.default_rng(seed)
+    base = cv2.imread(image_path) if image_path else None
+    if base is None:
+        base = cv2.GaussianBlur(rng.integers(0, 255, (480, 640, 3), dtype=np.uint8), (0, 0), 3)
+    height, width = base.shape[:2]
+    for _ in range(count):
+        size = int(rng.integers(80, min(200, height, width)))
+        x = int(rng.integers(0, width - size))
+        y = int(rng.integers(0, height - size))
+        yield base[y:y+size, x:x+size]
+
+def build(path, count, image_path, image_format):
+    db = FaceRecognitionDB(path, image_format=image_format)
+    user_id = db.add_user("bench", "bench")
+    rows = ((user_id, encode_face_image(crop, image_format)) for crop in synthetic_crops(count, image_path))
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == 1000:
+            db.save_encoded_face_images(chunk)
+            chunk = []
+    if chunk:
+        db.save_encoded_face_images(chunk)
+    db.close()
+    return user_id
+
+def child(mode, path, user_id, chunk_size, workers):
+    """Run one training path and print its timing as JSON"""
+    db = FaceRecognitionDB(path)
+    start = perf_counter()
+    if mode == 'materialized':
+        faces = [cv2.cvtColor(row['image'], cv2.COLOR_BGR2GRAY) for row in db.get_face_images(user_id)]
+        classifier = cv2.face.LBPHFaceRecognizer_create()
+        classifier.train(faces, np.zeros(len(faces), dtype=np.int32))
+        count = len(faces)
+    else:
+        from training import iter_training_batches, fit_lbph
+        batches = iter_training_batches(db, 0, user_id, chunk_size, workers)
+        classifier, count, _ = fit_lbph(None, batches, label=0)
+    elapsed = perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({'seconds': elapsed, 'images': count, 'peak_rss_mb': peak_kb / 1024}))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[300, 3000, 30000])
+    parser.add_argument('--image', help="image to cut synthetic face crops from")
+    parser.add_argument('--format', default='jpeg', choices=IMAGE_FORMATS, help="storage format of the images")
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--child', nargs=3, metavar=('MODE', 'DB', 'USER_ID'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        mode, path, user_id = args.child
+        child(mode, path, int(user_id), args.chunk_size, args.workers)
+        return
+
+    print(f"{'images':>8} {'path':>13} {'seconds':>9} {'images/s':>9} {'peak RSS MB':>12}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.db")
+            user_id = build(path, size, args.image, args.format)
+            for mode in ('materialized', 'streaming'):
+                cmd = [sys.executable, os.path.abspath(__file__), '--child', mode, path, str(user_id),
+                       '--chunk-size', str(args.chunk_size)]
+                if args.workers:
+                    cmd += ['--workers', str(args.workers)]
+                out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+                result = json.loads(out.strip().splitlines()[-1])
+                print(f"{size:>8} {mode:>13} {result['seconds']:>9.2f} "
+                      f"{result['images'] / result['seconds']:>9.0f} {result['peak_rss_mb']:>12.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+import os
+import threading
+from time import perf_counter
+import cv2
+import numpy as np
+from metrics import timed
+
+class FrameSource:
+    """
+    Base class for the frames fed to the capture, login and recognition loops.
+
+    read() mirrors cv2.VideoCapture.read(), so every source is a drop-in
+    replacement for the camera. Subclasses implement _open(), _grab() and
+    _close().
+
+    With realtime=True, frames are grabbed on a background thread at the
+    source's fps (or as fast as the device delivers them, for a camera) and
+    only the newest frame is kept: if the processing loop is slower, older
+    frames are overwritten (and counted as dropped) instead of queueing up,
+    exactly like a live camera. With realtime=False, every read() grabs the
+    next frame directly, so recordings play back at maximum speed with no
+    frames dropped - the mode for throughput benchmarks.
+    """
+    fps = None  # Playback rate of a recording; None if the device paces itself
+
+    def __init__(self, realtime=True):
+        self.realtime = realtime
+        self.frames_captured = 0
+        self.frames_dropped = 0
+
+        self._frame = None
+        self._frame_seq = 0       # Sequence number of the buffered frame
+        self._read_seq = 0        # Sequence number of the last frame handed out
+        self._running = False
+        self._thread = None
+        self._cond = threading.Condition()
+
+    def _open(self):
+        """Prepare the source; returns False if it cannot deliver frames"""
+        return True
+
+    def _grab(self):
+        """Return the next (ret, frame)"""
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+    def start(self):
+        """Open the source and, in real-time mode, start the reader thread"""
+        self._running = self._open()
+        if self.realtime:
+            self._thread = threading.Thread(target=self._reader, name=type(self).__name__, daemon=True)
+            self._thread.start()
+        return self
+
+    def _reader(self):
+        start = perf_counter()
+        while self._running:
+            ret, frame = self._grab()
+            with self._cond:
+                if ret and self.fps:
+                    # Hold the frame back until its place in the recording's timeline
+                    due = start + self.frames_captured / self.fps
+                    self._cond.wait_for(lambda: not self._running, due - perf_counter())
+                if not ret or not self._running:
+                    self._running = False
+                    self._cond.notify_all()
+                    break
+                # The buffered frame was never read - it is being dropped
+                if self._frame_seq > self._read_seq:
+                    self.frames_dropped += 1
+                self._frame = frame
+                self._frame_seq += 1
+                self.frames_captured += 1
+                self._cond.notify_all()
+
+    def isOpened(self):
+        """True while the source is delivering frames"""
+        return self._running
+
+    @timed('camera.read')
+    def read(self, timeout=2.0):
+        """
+        Return the next frame
+
+        In real-time mode this is the newest frame that has not been returned
+        before; it blocks until a fresh frame arrives, the source stops or
+        timeout seconds pass. Returns (ret, frame) like cv2.VideoCapture.read().
+        """
+        if not self.realtime:
+            if not self._running:
+                return False, None
+            ret, frame = self._grab()
+            if not ret:
+                self._running = False
+                return False, None
+            self.frames_captured += 1
+            return True, frame
+
+        with self._cond:
+            self._cond.wait_for(lambda: self._frame_seq > self._read_seq or not self._running, timeout)
+            if self._frame_seq <= self._read_seq:
+                return False, None
+            self._read_seq = self._frame_seq
+            return True, self._frame
+
+    def get_stats(self):
+        """Get frames captured and dropped so far"""
+        with self._cond:
+            return {
+                'frames_captured': self.frames_captured,
+                'frames_dropped': self.frames_dropped
+            }
+
+    def release(self):
+        """Stop the reader thread and release the source"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        self._close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+class ThreadedCapture(FrameSource):
+    """
+    Camera reader that runs cv2.VideoCapture on a background thread.
+
+    Always real-time: the camera delivers frames at its own rate and only
+    the newest one is kept.
+    """
+    def __init__(self, source=0):
+        super().__init__(realtime=True)
+        self.source = source
+        self.cap = None
+
+    def _open(self):
+        self.cap = cv2.VideoCapture(self.source)
+        # Ask the driver not to queue frames on our behalf
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return self.cap.isOpened()
+
+    def _grab(self):
+        return self.cap.read()
+
+    def _close(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+class VideoFileSource(FrameSource):
+    """Frames of a recorded video, played back at its own frame rate or at maximum speed"""
+    def __init__(self, path, realtime=True, loop=False):
+        super().__init__(realtime)
+        self.path = path
+        self.loop = loop  # Start again from the first frame at the end
+        self.cap = None
+
+    def _open(self):
+        self.cap = cv2.VideoCapture(self.path)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        return self.cap.isOpened()
+
+    def _grab(self):
+        ret, frame = self.cap.read()
+        if not ret and self.loop and self.frames_captured > 0:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read()
+        return ret, frame
+
+    def _close(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+class ImageDirectorySource(FrameSource):
+    """The images in a directory, sorted by file name, as frames at fps"""
+    def __init__(self, path, fps=30.0, realtime=True, loop=False):
+        super().__init__(realtime)
+        self.path = path
+        self.fps = fps
+        self.loop = loop
+        self.files = []
+        self._index = 0
+
+    def _open(self):
+        self.files = [os.path.join(self.path, name) for name in sorted(os.listdir(self.path))]
+        self._index = 0
+        return bool(self.files)
+
+    def _grab(self):
+        misses = 0
+        while misses <= len(self.files):
+            if self._index >= len(self.files):
+                if not self.loop:
+                    return False, None
+                self._index = 0
+            frame = cv2.imread(self.files[self._index])
+            self._index += 1
+            if frame is not None:
+                return True, frame
+            misses += 1  # Skip files that are not images
+        return False, None
+
+class SyntheticSource(FrameSource):
+    """
+    Generated frames, for benchmarking without a camera or recordings.
+
+    With an image (e.g. a photo of a face), each frame is that image on a
+    grey background, drifting a few pixels along a fixed path with a little
+    sensor noise, so detection, tracking and recognition all have work to
+    do. Without one, frames are pure noise. The noise is seeded, so every
+    run sees exactly the same frames.
+    """
+    def __init__(self, image=None, size=(640, 480), frames=300, fps=30.0, realtime=True, seed=0):
+        super().__init__(realtime)
+        self.image = image
+        self.size = size           # (width, height)
+        self.frames = frames       # None for an endless stream
+        self.fps = fps
+        self.seed = seed
+        self._rng = None
+        self._index = 0
+
+    def _open(self):
+        if isinstance(self.image, str):
+            self.image = cv2.imread(self.image)
+            if self.image is None:
+                return False
+        if self.image is not None:
+            width, height = self.size
+            self.image = self.image[:height - 16, :width - 16]  # Leave room to drift
+        self._rng = np.random.default_rng(self.seed)
+        self._index = 0
+        return True
+
+    def _grab(self):
+        if self.frames is not None and self._index >= self.frames:
+            return False, None
+        width, height = self.size
+        if self.image is None:
+            frame = self._rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        else:
+            frame = np.full((height, width, 3), 128, dtype=np.uint8)
+            h, w = self.image.shape[:2]
+            x = (width - w) // 2 + int(6 * np.sin(self._index / 15))
+            y = (height - h) // 2 + int(4 * np.cos(self._index / 20))
+            frame[y:y+h, x:x+w] = self.image
+            noise = self._rng.integers(-3, 4, frame.shape, dtype=np.int16)
+            frame = cv2.add(frame, noise, dtype=cv2.CV_8U)
+        self._index += 1
+        return True, frame
+
+def open_frame_source(source=0, realtime=True, loop=False):
+    """
+    Create (but do not start) a FrameSource from a source spec
+
+        0, 1, "0"             camera index (always real-time)
+        "synthetic"           noise frames
+        "synthetic:face.jpg"  the image drifting over a grey background
+        a directory           its images, sorted by name
+        anything else         a video file (or stream URL)
+
+    A FrameSource is returned as it is.
+    """
+    if isinstance(source, FrameSource):
+        return source
+    if isinstance(source, int) or str(source).isdigit():
+        return ThreadedCapture(int(source))
+    if source == "synthetic" or source.startswith("synthetic:"):
+        image = source.partition(":")[2] or None
+        return SyntheticSource(image, frames=None if loop else 300, realtime=realtime)
+    if os.path.isdir(source):
+        return ImageDirectorySource(source, realtime=realtime, loop=loop)
+    return VideoFileSource(source, realtime=realtime, loop=loop)
@@ -1,25 +1,319 @@
 import sqlite3
-import os
+import threading
 from hashlib import sha256
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 import cv2
-import numpy as np
 from datetime import datetime
+from face_codec import IMAGE_FORMATS, encode_face_image, decode_face_image
+from image_store import FileImageStore
+from metrics import timed_methods
 
+# Versioned schema migrations, applied in order by FaceRecognitionDB.migrate().
+# The database's PRAGMA user_version records the last one applied; add new
+# steps at the end rather than editing released ones.
+class AddColumn(namedtuple('AddColumn', 'table column definition')):
+    """Migration step: ALTER TABLE ... ADD COLUMN, skipped if the column already exists"""
+
+MIGRATIONS = [
+    (1, (
+        # get_face_images / get_face_image_count: WHERE user_id = ? ORDER BY capture_time
+        "CREATE INDEX IF NOT EXISTS idx_face_images_user_time ON face_images (user_id, capture_time)",
+        # get_login_history: ORDER BY login_time, optionally WHERE user_id = ?
+        "CREATE INDEX IF NOT EXISTS idx_login_history_time ON login_history (login_time)",
+        "CREATE INDEX IF NOT EXISTS idx_login_history_user_time ON login_history (user_id, login_time)",
+    )),
+    (2, (
+        # Single shared LBPH model for 1:N identification, labelled with user ids.
+        # last_image_id is the newest face_images row folded into the model;
+        # removed_user_ids lists deleted users whose histograms are still in it.
+        """CREATE TABLE IF NOT EXISTS identification_model (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            model_data BLOB NOT NULL,
+            last_image_id INTEGER NOT NULL,
+            removed_user_ids TEXT NOT NULL DEFAULT ',',
+            train_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""",
+    )),
+    (3, (
+        # Newest face_images row folded into each user's classifier, for
+        # incremental training. 0 means unknown (trained before this column).
+        AddColumn('classifiers', 'last_image_id', "INTEGER NOT NULL DEFAULT 0"),
+    )),
+    (4, (
+        # Storage format of each face image (see face_codec.IMAGE_FORMATS).
+        # Existing rows are JPEG; convert_face_images() re-encodes them.
+        AddColumn('face_images', 'image_format', "TEXT NOT NULL DEFAULT 'jpeg'"),
+    )),
+    (5, (
+        # Images kept in a FileImageStore: image_hash names the file and
+        # image_data is left empty. NULL means the bytes are in image_data.
+        AddColumn('face_images', 'image_hash', "TEXT"),
+        "CREATE INDEX IF NOT EXISTS idx_face_images_hash ON face_images (image_hash)",
+    )),
+]
+
+def serialize_classifier(classifier):
+    """Serialize a face recognizer to YAML bytes in memory (same layout as classifier.save())"""
+    # Histograms are stored as base64 blocks, which are much faster to write and
+    # parse than plain-text floats; readers handle both forms transparently
+    fs = cv2.FileStorage('.yml', cv2.FILE_STORAGE_WRITE | cv2.FILE_STORAGE_MEMORY | cv2.FILE_STORAGE_BASE64)
+    # FaceRecognizer.save() nests the model under its default name; do the same
+    cv2.Algorithm.write(classifier, fs, classifier.getDefaultName())
+    return fs.releaseAndGetString().encode()
+
+def deserialize_classifier(classifier_bytes):
+    """Load an LBPH face recognizer from bytes produced by serialize_classifier() or classifier.save()"""
+    if isinstance(classifier_bytes, (bytes, bytearray, memoryview)):
+        classifier_bytes = bytes(classifier_bytes).decode()
+    fs = cv2.FileStorage(classifier_bytes, cv2.FILE_STORAGE_READ | cv2.FILE_STORAGE_MEMORY)
+    try:
+        classifier = cv2.face.LBPHFaceRecognizer_create()
+        cv2.Algorithm.read(classifier, fs.getFirstTopLevelNode())
+        return classifier
+    finally:
+        fs.release()
+
+class ClassifierCache:
+    """
+    Bounded LRU cache of deserialized classifiers.
+
+    Entries are keyed by (user_id, classifier row id, train_time), so a newer
+    model saved by any process is never served from a stale entry. Memory use
+    is estimated from the size of the serialized model. The least recently
+    used entries are evicted once max_entries or max_bytes is exceeded.
+    """
+    def __init__(self, max_entries=8, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (classifier, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached classifier for key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, classifier, size):
+        """Cache a classifier, replacing any older model for the same user"""
+        with self._lock:
+            self._discard_user(key[0])
+            if size > self.max_bytes or self.max_entries <= 0:
+                return
+            self._entries[key] = (classifier, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, user_id):
+        """Drop any cached classifier for a user"""
+        with self._lock:
+            self._discard_user(user_id)
+
+    def _discard_user(self, user_id):
+        for key in [k for k in self._entries if k[0] == user_id]:
+            self._bytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self):
+        """Get hit/miss counts and current memory use"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+class ConnectionPool:
+    """
+    One SQLite connection per thread, all configured with the same pragmas.
+
+    sqlite3 connections must not be shared between threads, so every thread
+    that touches the database (Tk, enrollment writer, workers) gets its own.
+    With WAL enabled, readers on one connection are not blocked by a writer
+    on another.
+    """
+    # Applied to every new connection
+    PRAGMAS = (
+        "PRAGMA foreign_keys = ON",
+        "PRAGMA journal_mode = WAL",     # Readers don't block the writer and vice versa
+        "PRAGMA synchronous = NORMAL",   # Safe with WAL, avoids an fsync per commit
+        "PRAGMA cache_size = -16000",    # 16 MB page cache
+        "PRAGMA temp_store = MEMORY",
+    )
+
+    def __init__(self, db_name, timeout=10.0):
+        self.db_name = db_name
+        self.timeout = timeout  # Seconds to wait for a lock held by another connection
+        self._local = threading.local()
+        self._connections = set()
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Return the calling thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_name, timeout=self.timeout, check_same_thread=False)
+            for pragma in self.PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            self._local.cursor = conn.cursor()
+            with self._lock:
+                self._connections.add(conn)
+        return conn
+
+    def cursor(self):
+        """Return the calling thread's shared cursor"""
+        self.get()
+        return self._local.cursor
+
+    def release(self):
+        """Close the calling thread's connection (e.g. before a worker thread exits)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            self._local.cursor = None
+            with self._lock:
+                self._connections.discard(conn)
+            conn.close()
+
+    def close_all(self):
+        """Close every connection opened through this pool"""
+        with self._lock:
+            connections, self._connections = self._connections, set()
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+class FaceImageWriter:
+    """
+    Buffered writer for enrollment images.
+
+    Images are collected into batches of batch_size. Each full batch is
+    encoded in the database's image_format and inserted with executemany() on a background thread,
+    using that thread's own connection, with one commit per batch instead of
+    one per image. Use it as a context manager so the last partial batch is
+    written:
+
+        with db.face_image_writer(user_id) as writer:
+            writer.add(face_img)
+        if writer.error:
+            ...
+
+    The first batch that fails to encode or insert is printed and kept in
+    error; add() then refuses further images and close() returns False.
+    """
+    def __init__(self, db, user_id, batch_size=50):
+        self.db = db
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.saved = 0
+        self.error = None
+        self._batch = []
+        self._futures = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="FaceImageWriter")
+
+    def add(self, image):
+        """Queue an image; a full batch is handed to the writer thread. Returns False after a failed batch"""
+        if not self._check():
+            return False
+        # Copy, since the caller keeps drawing on the frame this crop came from
+        self._batch.append(image.copy())
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+        return True
+
+    def flush(self):
+        """Hand all queued images to the writer thread"""
+        batch, self._batch = self._batch, []
+        if batch:
+            self._futures.append(self._executor.submit(self._write_batch, batch))
+        return self._check()
+
+    def _check(self):
+        """Collect the batches written so far; returns False once one of them has failed"""
+        done = [future for future in self._futures if future.done()]
+        for future in done:
+            self._futures.remove(future)
+            if future.exception() is not None and self.error is None:
+                self.error = future.exception()
+                print(f"Error writing face images: {self.error}")
+        return self.error is None
+
+    def _write_batch(self, images):
+        image_format = self.db.image_format
+        rows = [(self.user_id, encode_face_image(image, image_format)) for image in images]
+        rows = [row for row in rows if row[1] is not None]
+        if rows:
+            if not self.db.save_encoded_face_images(rows, image_format):
+                raise sqlite3.Error(f"{len(rows)} face images could not be inserted")
+            self.saved += len(rows)
+        if len(rows) < len(images):
+            raise ValueError(f"{len(images) - len(rows)} of {len(images)} face images could not be encoded")
+
+    def close(self):
+        """Write the last batch, wait for the writer thread and release its connection; returns False if a batch failed"""
+        try:
+            self.flush()
+        finally:
+            self._executor.submit(self.db.pool.release)
+            self._executor.shutdown(wait=True)
+        return self._check()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+@timed_methods('db.')
 class FaceRecognitionDB:
-    def __init__(self, db_name="face_recognition.db"):
+    def __init__(self, db_name="face_recognition.db", image_batch_size=50,
+                 classifier_cache_size=8, classifier_cache_bytes=256 * 1024 * 1024, image_format='png',
+                 image_store=None):
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"image_format must be one of {IMAGE_FORMATS}")
         self.db_name = db_name
-        self.conn = None
-        self.cursor = None
+        self.image_format = image_format          # Storage format for new face images
+        # Directory (or FileImageStore) for image bytes; None keeps them in SQLite
+        self.image_store = FileImageStore(image_store) if isinstance(image_store, str) else image_store
+        self.image_batch_size = image_batch_size  # Face images per commit when enrolling
+        self.classifier_cache = ClassifierCache(classifier_cache_size, classifier_cache_bytes)
+        self.pool = ConnectionPool(db_name)
         self.initialize_db()
         self.create_admin_account()
     
+    @property
+    def conn(self):
+        """Connection for the calling thread (WAL mode, foreign keys on)"""
+        return self.pool.get()
+    
+    @property
+    def cursor(self):
+        """Cursor for the calling thread"""
+        return self.pool.cursor()
+    
     def initialize_db(self):
         """Initialize database and create tables if they don't exist"""
-        self.conn = sqlite3.connect(self.db_name)
-        self.cursor = self.conn.cursor()
-        
-        # Enable foreign key constraints
-        self.cursor.execute("PRAGMA foreign_keys = ON")
+        # Pragmas (WAL, foreign keys, cache size) are applied per connection by the pool
         
         # Create users table
         self.cursor.execute('''
@@ -70,6 +364,40 @@ class FaceRecognitionDB:
         ''')
         
         self.conn.commit()
+        
+        # Bring indexes and later schema changes up to date
+        self.migrate()
+    
+    def get_schema_version(self):
+        """Get the number of the last schema migration applied"""
+        return self.cursor.execute("PRAGMA user_version").fetchone()[0]
+    
+    def migrate(self):
+        """Apply pending schema migrations, each in its own transaction"""
+        current = self.get_schema_version()
+        for version, statements in MIGRATIONS:
+            if version <= current:
+                continue
+            try:
+                self.cursor.execute("BEGIN")
+                for statement in statements:
+                    if isinstance(statement, AddColumn):
+                        # Re-running a migration (user_version reset) must not fail on a duplicate column
+                        columns = [row[1] for row in self.cursor.execute(f"PRAGMA table_info({statement.table})")]
+                        if statement.column in columns:
+                            continue
+                        statement = (f"ALTER TABLE {statement.table} "
+                                     f"ADD COLUMN {statement.column} {statement.definition}")
+                    self.cursor.execute(statement)
+                # PRAGMA does not accept parameters; version is an int from MIGRATIONS
+                self.cursor.execute(f"PRAGMA user_version = {int(version)}")
+                self.conn.commit()
+            except Exception as e:
+                self.conn.rollback()
+                print(f"Error applying schema migration {version}: {e}")
+                raise
+            current = version
+        return current
     
     def create_admin_account(self):
         """Create default admin account if it doesn't exist"""
@@ -154,6 +482,15 @@ class FaceRecognitionDB:
             } for row in self.cursor.fetchall()
         ]
     
+    def get_user_id(self, username):
+        """Get a user's ID by username, or None if there is no such user"""
+        self.cursor.execute(
+            "SELECT id FROM users WHERE username = ?",
+            (username,)
+        )
+        result = self.cursor.fetchone()
+        return result[0] if result else None
+    
     def user_exists(self, username):
         """Check if a username exists"""
         self.cursor.execute(
@@ -162,32 +499,77 @@ class FaceRecognitionDB:
         )
         return self.cursor.fetchone() is not None
     
+    def set_admin(self, user_id, is_admin):
+        """Grant or revoke admin privileges"""
+        self.cursor.execute(
+            "UPDATE users SET is_admin = ? WHERE id = ?",
+            (int(is_admin), user_id)
+        )
+        self.conn.commit()
+        return True
+    
     def delete_user(self, user_id):
         """Delete a user and all their associated data"""
         try:
+            image_hashes = [row[0] for row in self.cursor.execute(
+                "SELECT DISTINCT image_hash FROM face_images WHERE user_id = ? AND image_hash IS NOT NULL",
+                (user_id,)
+            ).fetchall()]
+            
             # Cascading deletes will handle face_images, classifiers, and login_history
             self.cursor.execute(
                 "DELETE FROM users WHERE id = ?",
                 (user_id,)
             )
+            # LBPH can't drop samples, so the shared model just stops matching this user
+            self.cursor.execute(
+                "UPDATE identification_model SET removed_user_ids = removed_user_ids || ? || ','",
+                (str(user_id),)
+            )
             self.conn.commit()
+            self.classifier_cache.invalidate(user_id)
+            self._release_image_files(image_hashes)
             return True
         except:
             self.conn.rollback()
             return False
     
     # ========== Face Image Management ==========
+    def _store_image_data(self, image_data):
+        """Split encoded image bytes into the (image_data, image_hash) column values"""
+        if self.image_store is None:
+            return image_data, None
+        return b'', self.image_store.put(image_data)
+    
+    def _load_image_data(self, image_data, image_hash):
+        """Get the encoded bytes of a face_images row, or None if they are missing"""
+        if image_hash is None:
+            return image_data
+        if self.image_store is None:
+            print(f"Face image {image_hash} is in an image store, but none is configured")
+            return None
+        return self.image_store.read(image_hash)
+    
+    def _release_image_files(self, image_hashes):
+        """Delete store files that no face_images row refers to any more"""
+        if self.image_store is None:
+            return
+        for image_hash in image_hashes:
+            self.cursor.execute("SELECT 1 FROM face_images WHERE image_hash = ? LIMIT 1", (image_hash,))
+            if self.cursor.fetchone() is None:
+                self.image_store.delete(image_hash)
+    
     def save_face_image(self, user_id, image):
         """Save a face image to the database"""
-        # Convert image to JPEG bytes
-        success, encoded_image = cv2.imencode('.jpg', image)
-        if not success:
+        # Convert image to bytes in the configured storage format
+        image_data = encode_face_image(image, self.image_format)
+        if image_data is None:
             return False
         
         try:
             self.cursor.execute(
-                "INSERT INTO face_images (user_id, image_data) VALUES (?, ?)",
-                (user_id, encoded_image.tobytes())
+                "INSERT INTO face_images (user_id, image_data, image_hash, image_format) VALUES (?, ?, ?, ?)",
+                (user_id, *self._store_image_data(image_data), self.image_format)
             )
             self.conn.commit()
             return True
@@ -195,49 +577,226 @@ class FaceRecognitionDB:
             self.conn.rollback()
             return False
     
+    def save_face_images(self, user_id, images, batch_size=None):
+        """Save many face images, committing once per batch; returns the number saved"""
+        with self.face_image_writer(user_id, batch_size) as writer:
+            for image in images:
+                writer.add(image)
+        return writer.saved
+    
+    def save_encoded_face_images(self, rows, image_format=None):
+        """Insert (user_id, image_bytes) rows encoded in image_format (default: the database's) in a single transaction"""
+        image_format = image_format or self.image_format
+        try:
+            # Store files are written first; a failed insert can leave unreferenced
+            # files behind, which prune_image_store() removes
+            rows = [(user_id, *self._store_image_data(image_data), image_format) for user_id, image_data in rows]
+            self.cursor.executemany(
+                "INSERT INTO face_images (user_id, image_data, image_hash, image_format) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self.conn.commit()
+            return True
+        except Exception as e:
+            self.conn.rollback()
+            print(f"Error saving face images: {e}")
+            return False
+    
+    def face_image_writer(self, user_id, batch_size=None):
+        """Buffered writer that encodes off-thread and commits in batches"""
+        return FaceImageWriter(self, user_id, batch_size or self.image_batch_size)
+    
     def get_face_images(self, user_id, limit=None):
         """Retrieve face images for a user"""
-        query = "SELECT image_data, capture_time FROM face_images WHERE user_id = ? ORDER BY capture_time DESC"
+        return list(self.iter_face_images(user_id, limit=limit))
+    
+    def iter_face_images(self, user_id, limit=None, since=None, grayscale=False, chunk_size=100):
+        """
+        Lazily yield a user's face images, newest first
+        
+        Rows are fetched chunk_size at a time from a dedicated cursor and
+        decoded one by one, so only one chunk of compressed images and one
+        decoded image are held in memory at any time.
+        
+        Args:
+            user_id: Owner of the images
+            limit: Maximum number of images to yield
+            since: Only images captured at or after this datetime (or SQLite timestamp string)
+            grayscale: Decode straight to grayscale instead of BGR
+            chunk_size: Rows fetched from SQLite per round trip
+            
+        Yields:
+            dict: id, image, capture_time
+        """
+        query = "SELECT id, image_data, capture_time, image_format, image_hash FROM face_images WHERE user_id = ?"
         params = (user_id,)
         
+        if since is not None:
+            if isinstance(since, datetime):
+                since = since.strftime('%Y-%m-%d %H:%M:%S')
+            query += " AND capture_time >= ?"
+            params += (since,)
+        
+        query += " ORDER BY capture_time DESC, id DESC"
+        
         if limit:
             query += " LIMIT ?"
-            params = (user_id, limit)
+            params += (limit,)
+        
+        # Own cursor, so the shared one can be used while this is being consumed
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    image_data = self._load_image_data(row[1], row[4])
+                    yield {
+                        'id': row[0],
+                        'image': decode_face_image(image_data, row[3], grayscale),
+                        'capture_time': row[2]
+                    }
+        finally:
+            cursor.close()
+    
+    def iter_face_image_rows(self, after_id=0, user_id=None, chunk_size=500):
+        """Yield lists of raw (id, user_id, image_bytes, image_format) rows stored after the given image id, oldest first"""
+        query = "SELECT id, user_id, image_data, image_format, image_hash FROM face_images WHERE id > ?"
+        params = (after_id,)
+        
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params += (user_id,)
+        
+        # Own cursor, so the shared one can be used while this is being consumed
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(query + " ORDER BY id", params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [(image_id, owner_id, self._load_image_data(image_data, image_hash), image_format)
+                       for image_id, owner_id, image_data, image_format, image_hash in rows]
+        finally:
+            cursor.close()
+    
+    def convert_face_images(self, image_format=None, chunk_size=500):
+        """
+        Re-encode stored face images into image_format (default: the database's)
+        
+        Rows are converted in id order, one transaction per chunk, so the
+        conversion can be interrupted and resumed. Ids are kept, so trained
+        classifiers stay in step with the images. The database file only
+        shrinks after a VACUUM.
+        
+        Returns:
+            int: Number of images converted
+        """
+        image_format = image_format or self.image_format
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"image_format must be one of {IMAGE_FORMATS}")
+        
+        converted = 0
+        last_id = 0
+        while True:
+            rows = self.cursor.execute(
+                "SELECT id, image_data, image_format, image_hash FROM face_images "
+                "WHERE id > ? AND image_format != ? ORDER BY id LIMIT ?",
+                (last_id, image_format, chunk_size)
+            ).fetchall()
+            if not rows:
+                return converted
+            last_id = rows[-1][0]
             
-        self.cursor.execute(query, params)
-        results = []
-        for row in self.cursor.fetchall():
-            img_data = np.frombuffer(row[0], dtype=np.uint8)
-            img = cv2.imdecode(img_data, cv2.IMREAD_COLOR)
-            results.append({
-                'image': img,
-                'capture_time': row[1]
-            })
-        return results
-    
-    def get_face_image_count(self, user_id):
-        """Get count of face images for a user"""
+            updates = []
+            old_hashes = set()
+            for image_id, image_data, old_format, image_hash in rows:
+                image = decode_face_image(self._load_image_data(image_data, image_hash), old_format)
+                new_data = encode_face_image(image, image_format) if image is not None else None
+                if new_data is not None:
+                    updates.append((*self._store_image_data(new_data), image_format, image_id))
+                    if image_hash is not None:
+                        old_hashes.add(image_hash)
+            try:
+                self.cursor.executemany(
+                    "UPDATE face_images SET image_data = ?, image_hash = ?, image_format = ? WHERE id = ?",
+                    updates
+                )
+                self.conn.commit()
+                converted += len(updates)
+                self._release_image_files(old_hashes)
+            except Exception as e:
+                self.conn.rollback()
+                print(f"Error converting face images: {e}")
+                return converted
+    
+    def move_face_images_to_store(self, chunk_size=500):
+        """
+        Move image bytes still held in SQLite into the image store
+        
+        Each chunk is written to the store and then committed, leaving only
+        the hash in the row. Run VACUUM afterwards to shrink the database file.
+        
+        Returns:
+            int: Number of images moved
+        """
+        if self.image_store is None:
+            raise ValueError("No image store configured")
+        
+        moved = 0
+        last_id = 0
+        while True:
+            rows = self.cursor.execute(
+                "SELECT id, image_data FROM face_images WHERE id > ? AND image_hash IS NULL ORDER BY id LIMIT ?",
+                (last_id, chunk_size)
+            ).fetchall()
+            if not rows:
+                return moved
+            last_id = rows[-1][0]
+            
+            updates = [(self.image_store.put(image_data), image_id) for image_id, image_data in rows]
+            try:
+                self.cursor.executemany(
+                    "UPDATE face_images SET image_data = x'', image_hash = ? WHERE id = ?",
+                    updates
+                )
+                self.conn.commit()
+                moved += len(updates)
+            except Exception as e:
+                self.conn.rollback()
+                print(f"Error moving face images to the image store: {e}")
+                return moved
+    
+    def prune_image_store(self):
+        """Delete store files that no face_images row refers to; returns the number deleted"""
+        if self.image_store is None:
+            return 0
+        referenced = {row[0] for row in self.cursor.execute(
+            "SELECT DISTINCT image_hash FROM face_images WHERE image_hash IS NOT NULL")}
+        removed = 0
+        for image_hash in list(self.image_store.iter_hashes()):
+            if image_hash not in referenced:
+                self.image_store.delete(image_hash)
+                removed += 1
+        return removed
+    
+    def get_face_image_count(self, user_id, after_id=0):
+        """Get count of face images for a user (only those stored after after_id, if given)"""
         self.cursor.execute(
-            "SELECT COUNT(*) FROM face_images WHERE user_id = ?",
-            (user_id,)
+            "SELECT COUNT(*) FROM face_images WHERE user_id = ? AND id > ?",
+            (user_id, after_id)
         )
         return self.cursor.fetchone()[0]
     
     # ========== Classifier Management ==========
-    def save_classifier(self, user_id, classifier, image_count):
-        """Save trained classifier to database"""
-
-        
+    def save_classifier(self, user_id, classifier, image_count, last_image_id=0):
+        """Save trained classifier to database, with the newest image id it was trained on"""
         try:
-            # Save classifier to a temporary file
-            temp_filename = f"temp_classifier_{user_id}.yml"
-            classifier.save(temp_filename)
-            # Read the file data
-            with open(temp_filename, 'rb') as f:
-                classifier_bytes = f.read()
-
-            # Delete the temporary file
-            os.remove(temp_filename)
+            # Serialize in memory - no temp file, so concurrent saves can't collide
+            classifier_bytes = serialize_classifier(classifier)
 
              # Delete existing classifier if it exists
             self.cursor.execute(
@@ -248,54 +807,111 @@ class FaceRecognitionDB:
              # Insert new classifier
             self.cursor.execute(
                 """INSERT INTO classifiers 
-                (user_id, classifier_data, image_count) 
-                VALUES (?, ?, ?)""",
-                (user_id, classifier_bytes, image_count)
+                (user_id, classifier_data, image_count, last_image_id) 
+                VALUES (?, ?, ?, ?)""",
+                (user_id, classifier_bytes, image_count, last_image_id)
             )
 
             self.conn.commit()
+            self.classifier_cache.invalidate(user_id)
             return True
         except Exception as e:
             self.conn.rollback()
             print(f"Error saving classifier: {e}")
             return False
     
-    def get_classifier(self, user_id):
-        """Retrieve classifier for a user"""
+    def get_classifier(self, user_id, cached=True):
+        """
+        Retrieve classifier for a user (served from the LRU cache when unchanged)
+        
+        Pass cached=False to get a private copy that is safe to modify,
+        e.g. with LBPHFaceRecognizer.update().
+        """
+        # Only fetch the metadata first; the blob is read on a cache miss
         self.cursor.execute(
-            "SELECT classifier_data FROM classifiers WHERE user_id = ?",
+            "SELECT id, train_time, length(classifier_data) FROM classifiers WHERE user_id = ?",
             (user_id,)
         )
         result = self.cursor.fetchone()
-        if result:
-            temp_filename = f"temp_classifier_{user_id}.yml"
-            with open(temp_filename, 'wb') as f:
-                f.write(result[0])
-
-            # Load the classifier
-            classifier = cv2.face.LBPHFaceRecognizer_create()
-            classifier.read(temp_filename)
-
-            # Delete the temporary file
-            os.remove(temp_filename)
-
+        if not result:
+            self.classifier_cache.invalidate(user_id)
+            return None
+        
+        key = (user_id, result[0], result[1])
+        classifier = self.classifier_cache.get(key) if cached else None
+        if classifier is not None:
             return classifier
-        return None
+        
+        self.cursor.execute(
+            "SELECT classifier_data FROM classifiers WHERE id = ?",
+            (result[0],)
+        )
+        row = self.cursor.fetchone()
+        if not row:
+            return None
+        
+        # Load the classifier straight from the stored bytes
+        classifier = deserialize_classifier(row[0])
+        if cached:
+            self.classifier_cache.put(key, classifier, result[2])
+        return classifier
     
     def get_classifier_info(self, user_id):
         """Get classifier metadata"""
         self.cursor.execute(
-            "SELECT train_time, image_count FROM classifiers WHERE user_id = ?",
+            "SELECT train_time, image_count, last_image_id FROM classifiers WHERE user_id = ?",
             (user_id,)
         )
         result = self.cursor.fetchone()
         if result:
             return {
                 'train_time': result[0],
-                'image_count': result[1]
+                'image_count': result[1],
+                'last_image_id': result[2]
+            }
+        return None
+    
+    # ========== Identification Model ==========
+    def save_identification_model(self, classifier, last_image_id, removed_user_ids=()):
+        """Save the shared multi-user model"""
+        try:
+            classifier_bytes = serialize_classifier(classifier)
+            removed = ',' + ''.join(f"{user_id}," for user_id in sorted(removed_user_ids))
+            self.cursor.execute(
+                """INSERT OR REPLACE INTO identification_model
+                (id, model_data, last_image_id, removed_user_ids, train_time)
+                VALUES (1, ?, ?, ?, CURRENT_TIMESTAMP)""",
+                (classifier_bytes, last_image_id, removed)
+            )
+            self.conn.commit()
+            return True
+        except Exception as e:
+            self.conn.rollback()
+            print(f"Error saving identification model: {e}")
+            return False
+    
+    def get_identification_model_info(self):
+        """Get shared model metadata (without loading the model)"""
+        self.cursor.execute(
+            "SELECT last_image_id, removed_user_ids, train_time FROM identification_model WHERE id = 1"
+        )
+        result = self.cursor.fetchone()
+        if result:
+            return {
+                'last_image_id': result[0],
+                'removed_user_ids': {int(x) for x in result[1].split(',') if x},
+                'train_time': result[2]
             }
         return None
     
+    def get_identification_model(self):
+        """Load the shared multi-user model, or None if it has not been built"""
+        self.cursor.execute("SELECT model_data FROM identification_model WHERE id = 1")
+        result = self.cursor.fetchone()
+        if result:
+            return deserialize_classifier(result[0])
+        return None
+    
     # ========== Login History ==========
     def log_login_attempt(self, user_id, success, ip_address=None, user_agent=None):
         """Record a login attempt"""
@@ -335,6 +951,12 @@ class FaceRecognitionDB:
             } for row in self.cursor.fetchall()
         ]
     
+    def clear_login_history(self):
+        """Delete all login history records"""
+        self.cursor.execute("DELETE FROM login_history")
+        self.conn.commit()
+        return True
+    
     # ========== Admin Statistics ==========
     def get_system_stats(self):
         """Get system statistics for admin dashboard"""
@@ -364,9 +986,9 @@ class FaceRecognitionDB:
         return stats
     
     def close(self):
-        """Close database connection"""
-        if self.conn:
-            self.conn.close()
+        """Close all database connections"""
+        if hasattr(self, 'pool'):
+            self.pool.close_all()
     
     def __del__(self):
         self.close()
\ No newline at end of file
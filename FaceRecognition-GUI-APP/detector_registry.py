@@ -0,0 +1,64 @@
+import os
+import threading
+from time import perf_counter
+import cv2
+
+FRONTAL_FACE_CASCADE = 'haarcascade_frontalface_default.xml'
+
+class DetectorRegistry:
+    """
+    Process-wide cache of loaded detectors (Haar cascades, models, ...).
+
+    Each detector is loaded once, the first time it is requested, and the
+    same instance is handed to every caller afterwards. Load time and cache
+    hits are recorded per key so they can be shown in the admin panel.
+    """
+    def __init__(self):
+        self._detectors = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        """Return the detector stored under key, calling loader() on first use"""
+        with self._lock:
+            if key in self._detectors:
+                self._stats[key]['hits'] += 1
+                return self._detectors[key]
+
+            start = perf_counter()
+            detector = loader()
+            load_time = perf_counter() - start
+
+            self._detectors[key] = detector
+            self._stats[key] = {'load_time': load_time, 'hits': 0}
+            return detector
+
+    def get_cascade(self, filename=FRONTAL_FACE_CASCADE):
+        """Return a shared CascadeClassifier for a bundled or absolute XML path"""
+        path = filename if os.path.isabs(filename) else cv2.data.haarcascades + filename
+
+        def load():
+            cascade = cv2.CascadeClassifier(path)
+            if cascade.empty():
+                raise IOError(f"Could not load cascade: {path}")
+            return cascade
+
+        return self.get(('cascade', path), load)
+
+    def get_stats(self):
+        """Get load time (seconds) and cache hits for every loaded detector"""
+        with self._lock:
+            return {key: dict(stats) for key, stats in self._stats.items()}
+
+    def clear(self):
+        """Drop all cached detectors and their statistics"""
+        with self._lock:
+            self._detectors.clear()
+            self._stats.clear()
+
+# Shared registry used by the GUI pages and SpoofingDetector
+registry = DetectorRegistry()
+
+def get_face_cascade():
+    """Return the process-wide frontal face cascade"""
+    return registry.get_cascade(FRONTAL_FACE_CASCADE)
@@ -0,0 +1,114 @@
+import cv2
+import numpy as np
+from face_codec import preprocess_face
+from liveness import laplacian_variance
+
+# Distinct, sharp crops needed before a user's classifier can be trained
+MIN_TRAINING_IMAGES = 30
+
+def largest_face(faces):
+    """Box (x, y, w, h) with the largest area, or None if there are no faces"""
+    if len(faces) == 0:
+        return None
+    return tuple(int(v) for v in max(faces, key=lambda box: box[2] * box[3]))
+
+def difference_hash(gray):
+    """64-bit dHash: one bit per horizontally adjacent pixel pair of a 9x8 thumbnail"""
+    thumb = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = thumb[:, 1:] > thumb[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+class EnrollmentSampler:
+    """
+    Decides which detected faces are worth storing during enrollment.
+
+    Only the largest face in a frame is considered, so bystanders are never
+    enrolled. Its crop is resized to FACE_SIZE and scored with the Laplacian
+    variance used by the texture check in SpoofingDetector; blurred crops
+    are rejected. Sharp crops are compared by difference hash with every
+    crop accepted so far and dropped if one is within max_hash_distance bits,
+    so a subject holding still does not fill the database with copies.
+    """
+    def __init__(self, min_sharpness=30, max_hash_distance=4):
+        self.min_sharpness = min_sharpness            # Laplacian variance of the 100x100 crop
+        self.max_hash_distance = max_hash_distance    # Differing dHash bits (of 64) that still count as a duplicate
+        self.reset()
+
+    def reset(self):
+        """Forget accepted crops and counters, for a new enrollment"""
+        self.hashes = []
+        self.stats = {'offered': 0, 'accepted': 0, 'blurry': 0, 'duplicate': 0, 'extra_faces': 0}
+
+    def offer(self, gray, faces):
+        """
+        Consider the faces detected in one grayscale frame
+
+        Returns:
+            tuple: (box, reason)
+                   box: Largest face (x, y, w, h), or None if there is none
+                   reason: None if the crop should be stored, otherwise
+                           'blurry' or 'duplicate'
+        """
+        box = largest_face(faces)
+        if box is None:
+            return None, None
+        self.stats['offered'] += 1
+        self.stats['extra_faces'] += len(faces) - 1
+
+        x, y, w, h = box
+        face = preprocess_face(gray[y:y+h, x:x+w])
+        if laplacian_variance(face) < self.min_sharpness:
+            self.stats['blurry'] += 1
+            return box, 'blurry'
+
+        face_hash = difference_hash(face)
+        for accepted in self.hashes:
+            if bin(face_hash ^ accepted).count('1') <= self.max_hash_distance:
+                self.stats['duplicate'] += 1
+                return box, 'duplicate'
+
+        self.hashes.append(face_hash)
+        self.stats['accepted'] += 1
+        return box, None
+
+    def get_stats(self):
+        """Get counts of offered, accepted and rejected crops"""
+        return dict(self.stats)
+
+def capture_faces(source, analyzer, sampler, writer, max_images=None, frame_step=1, on_frame=None):
+    """
+    Enrollment loop: store the sharp, distinct faces from a started frame source
+
+    Reads frames until the source ends, max_images crops have been handed
+    to writer (a FaceImageWriter), the writer reports a failed batch or
+    on_frame returns False. Only every
+    frame_step-th frame is analysed. on_frame(frame, box, reason, count)
+    is called after each analysed frame, with box and reason as returned by
+    EnrollmentSampler.offer(), so a GUI can annotate and show it.
+
+    Returns:
+        dict: frames read, faces queued for writing and frames without a face
+    """
+    stats = {'frames': 0, 'queued': 0, 'no_face': 0}
+    while not max_images or stats['queued'] < max_images:
+        ret, frame = source.read()
+        if not ret:
+            break
+        stats['frames'] += 1
+        if (stats['frames'] - 1) % frame_step:
+            continue
+
+        analysis = analyzer.analyze(frame)
+        box, reason = sampler.offer(analysis.gray, analysis.faces)
+        if box is None:
+            stats['no_face'] += 1
+        elif reason is None:
+            x, y, w, h = box
+            # Crop before on_frame draws on the frame, so the box outline is not saved with the face
+            if not writer.add(frame[y:y+h, x:x+w]):
+                break  # Images can no longer be saved; writer.error says why
+            stats['queued'] += 1
+
+        if on_frame is not None and on_frame(frame, box, reason, stats['queued']) is False:
+            break
+    return stats
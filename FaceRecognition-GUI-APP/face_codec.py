@@ -0,0 +1,58 @@
+import struct
+import cv2
+import numpy as np
+
+# Every face crop is resized to this size before training and prediction,
+# so LBPH histograms always describe the same grid over the face
+FACE_SIZE = (100, 100)
+
+# Storage formats for face_images.image_data:
+#   jpeg  the crop as captured (BGR, any size), JPEG-encoded - the original format
+#   png   grayscale FACE_SIZE crop, lossless PNG
+#   raw   grayscale FACE_SIZE crop as uint8 pixels after a (height, width) header
+IMAGE_FORMATS = ('jpeg', 'png', 'raw')
+
+_RAW_HEADER = struct.Struct('<HH')
+
+def preprocess_face(gray):
+    """Resize a grayscale face crop to FACE_SIZE"""
+    if (gray.shape[1], gray.shape[0]) == FACE_SIZE:
+        return gray
+    return cv2.resize(gray, FACE_SIZE, interpolation=cv2.INTER_AREA)
+
+def normalize_face(image):
+    """Convert a BGR or grayscale face crop to a grayscale FACE_SIZE crop"""
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return preprocess_face(image)
+
+def encode_face_image(image, image_format='jpeg'):
+    """Encode a face image in the given storage format, or None if encoding fails"""
+    if image_format == 'jpeg':
+        success, encoded_image = cv2.imencode('.jpg', image)
+    elif image_format == 'png':
+        success, encoded_image = cv2.imencode('.png', normalize_face(image), [cv2.IMWRITE_PNG_COMPRESSION, 3])
+    elif image_format == 'raw':
+        face = normalize_face(image)
+        return _RAW_HEADER.pack(*face.shape) + face.tobytes()
+    else:
+        raise ValueError(f"Unknown image format: {image_format}")
+    if not success:
+        return None
+    return encoded_image.tobytes()
+
+def decode_face_image(image_data, image_format='jpeg', grayscale=False):
+    """Decode stored image bytes to a BGR (or grayscale) image, or None if they are invalid"""
+    if image_data is None:
+        return None
+    if image_format == 'raw':
+        if len(image_data) < _RAW_HEADER.size:
+            return None
+        height, width = _RAW_HEADER.unpack_from(image_data)
+        if len(image_data) != _RAW_HEADER.size + height * width:
+            return None
+        gray = np.frombuffer(image_data, dtype=np.uint8, offset=_RAW_HEADER.size).reshape(height, width)
+        return gray if grayscale else cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+    flags = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+    return cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), flags)
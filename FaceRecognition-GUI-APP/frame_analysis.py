@@ -0,0 +1,161 @@
+import cv2
+import numpy as np
+from detector_registry import get_face_cascade
+from liveness import laplacian_variance, bright_ratio, liveness_roi
+from metrics import metrics
+
+class FrameAnalysis:
+    """
+    Results of analysing a single camera frame.
+
+    The grayscale image and face boxes are computed once by FrameAnalyzer.
+    The liveness metrics (reflection ratio and Laplacian texture score) are
+    computed on first access and cached, so stages that never read them
+    (e.g. face capture) do not pay for them. They only cover the first face,
+    resized to FACE_SIZE; without a face they fall back to the whole frame.
+    """
+    def __init__(self, frame, gray, faces, bright_threshold=220):
+        self.frame = frame
+        self.gray = gray
+        self.faces = faces
+        self.bright_threshold = bright_threshold
+        self._reflection_ratio = None
+        self._texture_score = None
+        self._liveness_roi = None
+
+    @property
+    def face(self):
+        """First detected face box (x, y, w, h), or None"""
+        return tuple(self.faces[0]) if len(self.faces) > 0 else None
+
+    def face_roi(self, box=None):
+        """Grayscale crop of the given box (defaults to the first face)"""
+        box = box if box is not None else self.face
+        if box is None:
+            return None
+        x, y, w, h = box
+        return self.gray[y:y+h, x:x+w]
+
+    @property
+    def liveness_roi(self):
+        """First face resized to FACE_SIZE (the whole frame if there is no face)"""
+        if self._liveness_roi is None:
+            self._liveness_roi = liveness_roi(self.gray, self.face) if self.face is not None else self.gray
+        return self._liveness_roi
+
+    @property
+    def reflection_ratio(self):
+        """Fraction of face pixels brighter than bright_threshold"""
+        if self._reflection_ratio is None:
+            self._reflection_ratio = bright_ratio(self.liveness_roi, self.bright_threshold)
+        return self._reflection_ratio
+
+    @property
+    def texture_score(self):
+        """Variance of the Laplacian over the face, a measure of texture/sharpness"""
+        if self._texture_score is None:
+            self._texture_score = laplacian_variance(self.liveness_roi)
+        return self._texture_score
+
+class FrameAnalyzer:
+    """
+    Single-pass frame analysis pipeline.
+
+    Converts a frame to grayscale and runs face detection exactly once; the
+    returned FrameAnalysis is then shared by detection, liveness and
+    recognition stages instead of each stage redoing the work.
+    """
+    def __init__(self, face_cascade=None, scale_factor=1.3, min_neighbors=5, bright_threshold=220):
+        self.face_cascade = face_cascade if face_cascade is not None else get_face_cascade()
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.bright_threshold = bright_threshold
+
+    def analyze(self, frame):
+        """Analyse a BGR frame and return a FrameAnalysis"""
+        with metrics.timer('frame.cvtColor'):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        with metrics.timer('frame.detectMultiScale'):
+            faces = self.face_cascade.detectMultiScale(gray, self.scale_factor, self.min_neighbors)
+        return FrameAnalysis(frame, gray, faces, self.bright_threshold)
+
+class TrackingFrameAnalyzer(FrameAnalyzer):
+    """
+    FrameAnalyzer that detects on a downscaled frame and tracks the face.
+
+    A full-frame detection runs on a copy of the grayscale frame shrunk to
+    detect_width pixels wide. Following frames only search a margin around
+    the last known box (also at the reduced scale). A full-frame re-detect
+    happens every redetect_interval frames, or as soon as tracking is lost.
+    Boxes are always reported in full-resolution coordinates, so ROIs for
+    classifier.predict are cut from the original grayscale frame.
+
+    Unlike FrameAnalyzer this keeps per-loop state: create one per camera
+    loop (or call reset()) rather than sharing it.
+    """
+    def __init__(self, face_cascade=None, scale_factor=1.3, min_neighbors=5, bright_threshold=220,
+                 detect_width=320, margin=0.5, redetect_interval=10):
+        super().__init__(face_cascade, scale_factor, min_neighbors, bright_threshold)
+        self.detect_width = detect_width
+        self.margin = margin                        # Search margin, as a fraction of the box size
+        self.redetect_interval = redetect_interval  # Frames between full-frame detections
+        self.full_detections = 0
+        self.tracked_detections = 0
+        self.reset()
+
+    def reset(self):
+        """Forget the tracked face; the next frame gets a full detection"""
+        self.last_box = None
+        self.frames_since_detect = 0
+
+    def analyze(self, frame):
+        with metrics.timer('frame.cvtColor'):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        scale = min(1.0, self.detect_width / gray.shape[1])
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else gray
+
+        faces = None
+        if self.last_box is not None and self.frames_since_detect < self.redetect_interval:
+            faces = self._track(small, scale)
+            self.frames_since_detect += 1
+
+        # Periodic re-detect, or tracking lost
+        if faces is None:
+            faces = self._detect(small, 0, 0, scale)
+            self.full_detections += 1
+            self.frames_since_detect = 0
+
+        self.last_box = tuple(faces[0]) if len(faces) > 0 else None
+        return FrameAnalysis(frame, gray, faces, self.bright_threshold)
+
+    def _track(self, small, scale):
+        """Search around the last box; returns None if the face was lost"""
+        x, y, w, h = (int(v * scale) for v in self.last_box)
+        mx, my = int(w * self.margin), int(h * self.margin)
+        x0, y0 = max(0, x - mx), max(0, y - my)
+        x1, y1 = min(small.shape[1], x + w + mx), min(small.shape[0], y + h + my)
+
+        faces = self._detect(small[y0:y1, x0:x1], x0, y0, scale)
+        if len(faces) == 0:
+            return None
+        self.tracked_detections += 1
+        return faces
+
+    def _detect(self, small, offset_x, offset_y, scale):
+        """Detect in a (downscaled) image and map boxes back to full resolution"""
+        with metrics.timer('frame.detectMultiScale'):
+            boxes = self.face_cascade.detectMultiScale(small, self.scale_factor, self.min_neighbors)
+        if len(boxes) == 0:
+            return np.empty((0, 4), dtype=np.int32)
+
+        boxes = boxes.astype(np.float32)
+        boxes[:, 0] += offset_x
+        boxes[:, 1] += offset_y
+        return np.round(boxes / scale).astype(np.int32)
+
+    def get_stats(self):
+        """Get counts of full-frame and tracked detections"""
+        return {
+            'full_detections': self.full_detections,
+            'tracked_detections': self.tracked_detections
+        }
@@ -0,0 +1,119 @@
+import threading
+import cv2
+from training import iter_training_batches, fit_lbph
+
+class FaceIdentifier:
+    """
+    1:N identification with a single LBPH model shared by all users.
+
+    Every stored face image is labelled with its owner's user id, so a single
+    predict() call answers "who is this?" however many users are enrolled.
+    New enrollments are folded in with LBPHFaceRecognizer.update(), feeding
+    only the face_images rows newer than the last one the model has seen.
+
+    LBPH cannot forget samples, so deleted users are recorded by
+    FaceRecognitionDB.delete_user() and skipped at prediction time until
+    rebuild() retrains the model without them.
+    """
+    def __init__(self, db):
+        self.db = db
+        self.model = None
+        self.removed_user_ids = set()
+        self._version = None  # (last_image_id, train_time) of the loaded model
+        self._lock = threading.Lock()       # Guards model, removed_user_ids and _version
+        self._sync_lock = threading.Lock()  # One sync() or rebuild() at a time
+
+    def load(self):
+        """
+        Load (or refresh) the shared model from the database
+
+        The model is deserialized with no lock held, so predict() calls keep
+        going meanwhile. While a sync() is running, the model it is about to
+        swap in is not loaded a second time.
+        """
+        info = self.db.get_identification_model_info()
+        if info is None:
+            with self._lock:
+                self.model, self.removed_user_ids, self._version = None, set(), None
+            return False
+        version = (info['last_image_id'], info['train_time'])
+        loaded = self._version
+        if version != loaded and not (self.model is not None and self._sync_lock.locked()):
+            model = self.db.get_identification_model()
+            with self._lock:
+                # Unless a sync() swapped in a newer model meanwhile
+                if self._version == loaded:
+                    self.model, self._version = model, version
+        with self._lock:
+            self.removed_user_ids = info['removed_user_ids']
+        return self.model is not None
+
+    def _saved(self, model):
+        """Swap in a model that was just written to the database"""
+        info = self.db.get_identification_model_info()
+        with self._lock:
+            self.model = model
+            self._version = (info['last_image_id'], info['train_time'])
+            self.removed_user_ids = info['removed_user_ids']
+
+    def sync(self):
+        """
+        Fold face images stored since the last sync into the model; returns the number added
+
+        update() changes a model in place and can take seconds, so it runs on
+        a private copy read from the database with no lock held; predict()
+        keeps using the current model until the new one is swapped in.
+        """
+        with self._sync_lock:
+            info = self.db.get_identification_model_info()
+            model = self.db.get_identification_model() if info else None
+            last_image_id = info['last_image_id'] if info else 0
+
+            # Labels are the owners' user ids
+            model, added, last_image_id = fit_lbph(model, iter_training_batches(self.db, last_image_id))
+            if not added:
+                return 0
+            # Re-read, so users deleted while the model was training stay excluded
+            info = self.db.get_identification_model_info()
+            removed_user_ids = info['removed_user_ids'] if info else set()
+            if not self.db.save_identification_model(model, last_image_id, removed_user_ids):
+                return 0
+            self._saved(model)
+            return added
+
+    def rebuild(self):
+        """Retrain from every stored image, dropping deleted users' samples; returns the image count"""
+        with self._sync_lock:
+            info = self.db.get_identification_model_info()
+            removed_before = info['removed_user_ids'] if info else set()
+            model, added, last_image_id = fit_lbph(None, iter_training_batches(self.db))
+            if not added:
+                return 0
+            # Users deleted while the images were streaming may still have samples in the model
+            info = self.db.get_identification_model_info()
+            removed_user_ids = (info['removed_user_ids'] if info else set()) - removed_before
+            if not self.db.save_identification_model(model, last_image_id, removed_user_ids):
+                return 0
+            self._saved(model)
+            return added
+
+    def predict(self, roi_gray):
+        """
+        Identify a grayscale face crop (already passed through preprocess_face)
+
+        Returns (user_id, distance) like LBPHFaceRecognizer.predict(), or
+        (-1, inf) if no model has been built or only deleted users match.
+        """
+        with self._lock:
+            if self.model is None:
+                return -1, float('inf')
+            if not self.removed_user_ids:
+                return self.model.predict(roi_gray)
+
+            # Nearest sample that does not belong to a deleted user
+            collector = cv2.face.StandardCollector_create()
+            self.model.predict_collect(roi_gray, collector)
+            for label, distance in collector.getResults(True):
+                if label not in self.removed_user_ids:
+                    return label, distance
+            return -1, float('inf')
@@ -0,0 +1,72 @@
+import os
+import tempfile
+from hashlib import sha256
+
+class FileImageStore:
+    """
+    Content-addressed store for encoded face images.
+
+    Each image is written once to root/<first two hex digits>/<sha256 hex>,
+    named by the hash of its bytes, so identical crops share one file and a
+    file never changes after it is written. FaceRecognitionDB keeps only the
+    hash in face_images and deletes a file once no row refers to it.
+
+    Files are written to a temporary name and renamed into place, so a
+    reader never sees a partial image even if the writer is interrupted.
+    """
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, image_hash):
+        """Location of the file for a hash"""
+        return os.path.join(self.root, image_hash[:2], image_hash)
+
+    def put(self, image_data):
+        """Store image bytes (if not already present) and return their hash"""
+        image_hash = sha256(image_data).hexdigest()
+        path = self.path(image_hash)
+        if not os.path.exists(path):
+            directory = os.path.dirname(path)
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(image_data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        return image_hash
+
+    def read(self, image_hash):
+        """Read the bytes stored under a hash, or None if the file is missing"""
+        try:
+            with open(self.path(image_hash), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def delete(self, image_hash):
+        """Remove the file for a hash, if it exists"""
+        try:
+            os.unlink(self.path(image_hash))
+        except FileNotFoundError:
+            pass
+
+    def iter_hashes(self):
+        """Yield the hash of every stored file"""
+        for shard in os.scandir(self.root):
+            if shard.is_dir() and len(shard.name) == 2:
+                for entry in os.scandir(shard.path):
+                    if not entry.name.startswith('.tmp-'):
+                        yield entry.name
+
+    def get_stats(self):
+        """Get the number of files and their total size in bytes"""
+        files = 0
+        total_bytes = 0
+        for image_hash in self.iter_hashes():
+            files += 1
+            total_bytes += os.path.getsize(self.path(image_hash))
+        return {'files': files, 'bytes': total_bytes}
@@ -0,0 +1,288 @@
+import functools
+import inspect
+import json
+import threading
+from bisect import bisect_left
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+
+# Upper bounds (seconds) of the histogram buckets, from 100 us to 10 s
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_NO_TIMER = nullcontext()
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram.
+
+    observe() is O(log buckets) and keeps no samples, so memory stays
+    constant however long a kiosk runs. Percentiles are estimated by
+    linear interpolation inside the bucket that holds them.
+
+    Besides the all-time max, window_max is the largest observation since
+    the last MetricsRegistry.snapshot(reset_window=True), so interval
+    reports do not keep repeating an old spike.
+    """
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # Last bucket: above BUCKETS[-1]
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.window_max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        if seconds > self.window_max:
+            self.window_max = seconds
+
+    def copy(self):
+        other = Histogram()
+        other.counts = list(self.counts)
+        other.count, other.total, other.max = self.count, self.total, self.max
+        other.window_max = self.window_max
+        return other
+
+    def since(self, earlier):
+        """
+        Histogram of the observations made after the earlier copy
+
+        Its max is window_max, so earlier must come from the snapshot that
+        last reset the window for max to cover exactly that interval.
+        """
+        other = Histogram()
+        other.counts = [now - then for now, then in zip(self.counts, earlier.counts)]
+        other.count = self.count - earlier.count
+        other.total = self.total - earlier.total
+        other.max = other.window_max = self.window_max
+        return other
+
+    def percentile(self, q):
+        """Estimated q-th percentile (0-100) in seconds"""
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                low = BUCKETS[i - 1] if i > 0 else 0.0
+                high = BUCKETS[i] if i < len(BUCKETS) else self.max
+                return min(self.max, low + (high - low) * (rank - seen) / count)
+            seen += count
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total * 1000 / self.count if self.count else 0.0,
+            'p50_ms': self.percentile(50) * 1000,
+            'p95_ms': self.percentile(95) * 1000,
+            'p99_ms': self.percentile(99) * 1000,
+            'max_ms': self.max * 1000
+        }
+
+class MetricsRegistry:
+    """
+    Process-wide timing histograms for the hot paths, keyed by operation name.
+
+    Disabled by default. While disabled, timer() returns a shared no-op
+    context and the timed() wrappers make one attribute check before
+    calling straight through, so instrumented code pays a few hundred
+    nanoseconds per call at most. enable() turns recording on; the
+    histograms can then be read with snapshot(), served by MetricsServer or
+    printed by MetricsLogger.
+    """
+    def __init__(self):
+        self.enabled = False
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def observe(self, name, seconds):
+        """Record one duration for name"""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def timer(self, name):
+        """Context manager timing its block as name"""
+        if not self.enabled:
+            return _NO_TIMER
+        return _Timer(self, name)
+
+    def snapshot(self, reset_window=False):
+        """Copies of all histograms, safe to read while recording continues; reset_window starts a new window_max"""
+        with self._lock:
+            copies = {name: histogram.copy() for name, histogram in self._histograms.items()}
+            if reset_window:
+                for histogram in self._histograms.values():
+                    histogram.window_max = 0.0
+            return copies
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def to_json(self):
+        return json.dumps({name: histogram.to_dict() for name, histogram in sorted(self.snapshot().items())})
+
+    def to_prometheus(self):
+        """Histograms in the Prometheus text exposition format"""
+        lines = ["# HELP facerec_duration_seconds Duration of instrumented operations",
+                 "# TYPE facerec_duration_seconds histogram"]
+        for name, histogram in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float('inf'),), histogram.counts):
+                cumulative += count
+                le = "+Inf" if bound == float('inf') else repr(bound)
+                lines.append(f'facerec_duration_seconds_bucket{{op="{name}",le="{le}"}} {cumulative}')
+            lines.append(f'facerec_duration_seconds_sum{{op="{name}"}} {histogram.total}')
+            lines.append(f'facerec_duration_seconds_count{{op="{name}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+class _Timer:
+    __slots__ = ('registry', 'name', 'start')
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.observe(self.name, perf_counter() - self.start)
+
+# The registry all instrumented modules report to
+metrics = MetricsRegistry()
+
+def timed(name, registry=metrics):
+    """Decorator timing every call as name (generators: until exhausted or closed)"""
+    def decorate(fn):
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def generator_wrapper(*args, **kwargs):
+                if not registry.enabled:
+                    return (yield from fn(*args, **kwargs))
+                start = perf_counter()
+                try:
+                    return (yield from fn(*args, **kwargs))
+                finally:
+                    registry.observe(name, perf_counter() - start)
+            return generator_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return fn(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                registry.observe(name, perf_counter() - start)
+        return wrapper
+    return decorate
+
+def timed_methods(prefix, registry=metrics):
+    """Class decorator applying timed(prefix + method name) to every public method"""
+    def decorate(cls):
+        for attr, value in list(vars(cls).items()):
+            if not attr.startswith('_') and inspect.isfunction(value):
+                setattr(cls, attr, timed(prefix + attr, registry)(value))
+        return cls
+    return decorate
+
+class MetricsServer:
+    """
+    Local HTTP endpoint for the metrics registry.
+
+        GET /metrics       Prometheus text format
+        GET /metrics.json  count, mean, p50/p95/p99 and max (ms) per operation
+
+    Binds to 127.0.0.1 by default, so only the kiosk itself (or an agent
+    running on it) can scrape it. Serves from a daemon thread.
+    """
+    def __init__(self, port=9108, host="127.0.0.1", registry=metrics):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = registry.to_prometheus(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = registry.to_json(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass  # Scrapes are not worth a line on stderr each
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name="MetricsServer", daemon=True)
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class MetricsLogger(threading.Thread):
+    """
+    Prints one line per operation every interval seconds, covering only the
+    calls made during that interval (operations with no calls are skipped):
+
+        metrics: db.get_classifier n=3 mean=12.1ms p50=9.8ms p95=30.2ms p99=30.2ms max=31.0ms
+    """
+    def __init__(self, interval=60, registry=metrics, output=print):
+        super().__init__(name="MetricsLogger", daemon=True)
+        self.interval = interval
+        self.registry = registry
+        self.output = output
+        self._stop_event = threading.Event()
+
+    def run(self):
+        previous = {}
+        while not self._stop_event.wait(self.interval):
+            previous = self.log(previous)
+
+    def log(self, previous=None):
+        """Print the calls made since the previous snapshot; returns the new snapshot"""
+        # Each snapshot starts a new window, so max covers this interval only
+        current = self.registry.snapshot(reset_window=True)
+        for name, histogram in sorted(current.items()):
+            if previous and name in previous:
+                histogram = histogram.since(previous[name])
+            if not histogram.count:
+                continue
+            stats = histogram.to_dict()
+            self.output(f"metrics: {name} n={stats['count']} mean={stats['mean_ms']:.1f}ms "
+                        f"p50={stats['p50_ms']:.1f}ms p95={stats['p95_ms']:.1f}ms "
+                        f"p99={stats['p99_ms']:.1f}ms max={stats['max_ms']:.1f}ms")
+        return current
+
+    def stop(self):
+        self._stop_event.set()
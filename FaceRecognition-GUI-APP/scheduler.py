@@ -0,0 +1,81 @@
+from time import perf_counter
+from metrics import metrics
+
+# Target rate of each camera loop stage in Hz; None runs it on every frame
+DEFAULT_STAGE_RATES = {
+    'detect': 10,     # Face detection (FrameAnalyzer.analyze)
+    'liveness': 5,    # LivenessTracker.update
+    'predict': 5,     # classifier.predict
+    'display': None   # Annotate and show, at camera rate
+}
+
+class StageScheduler:
+    """
+    Runs each stage of a camera loop at its own rate.
+
+    run(name, fn, *args) calls fn only when the stage is due and otherwise
+    returns the stage's most recent result, so slow stages (detection,
+    prediction) can run a few times per second while the preview stays at
+    camera rate. Due times advance by whole periods, so a 10 Hz stage
+    averages 10 runs per second on a 30 fps camera instead of drifting to
+    the nearest multiple of the frame interval.
+
+    Call time and run/skip counts are kept per stage for tuning the rates
+    on slow hardware (get_stats()).
+    """
+    def __init__(self, rates=None, clock=perf_counter):
+        self.rates = dict(DEFAULT_STAGE_RATES if rates is None else rates)
+        self.clock = clock
+        self._next_due = {}
+        self._results = {}
+        self._stats = {}
+
+    def due(self, name, now=None):
+        """Whether the stage should run now"""
+        if name not in self._results or not self.rates.get(name):
+            return True
+        now = self.clock() if now is None else now
+        return now >= self._next_due[name]
+
+    def run(self, name, fn, *args):
+        """Call fn(*args) if the stage is due, else return its previous result"""
+        stats = self._stats.setdefault(name, {'runs': 0, 'skips': 0, 'total_time': 0.0, 'max_time': 0.0})
+        now = self.clock()
+        if not self.due(name, now):
+            stats['skips'] += 1
+            return self._results[name]
+
+        result = fn(*args)
+        elapsed = self.clock() - now
+        stats['runs'] += 1
+        stats['total_time'] += elapsed
+        stats['max_time'] = max(stats['max_time'], elapsed)
+        if metrics.enabled:
+            metrics.observe(f"stage.{name}", elapsed)
+
+        rate = self.rates.get(name)
+        if rate:
+            period = 1.0 / rate
+            next_due = self._next_due.get(name, now) + period
+            # Fell more than a period behind (slow stage or camera): restart the phase
+            self._next_due[name] = next_due if next_due > now else now + period
+        self._results[name] = result
+        return result
+
+    def invalidate(self, name):
+        """Drop a stage's cached result so it runs on the next call"""
+        self._results.pop(name, None)
+        self._next_due.pop(name, None)
+
+    def get_stats(self):
+        """Get runs, skips and average/max call time (ms) per stage"""
+        return {
+            name: {
+                'rate': self.rates.get(name),
+                'runs': stats['runs'],
+                'skips': stats['skips'],
+                'avg_ms': stats['total_time'] * 1000 / stats['runs'] if stats['runs'] else 0.0,
+                'max_ms': stats['max_time'] * 1000
+            }
+            for name, stats in self._stats.items()
+        }
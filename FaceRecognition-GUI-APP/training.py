@@ -0,0 +1,116 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from face_codec import preprocess_face, decode_face_image
+
+def decode_face(image_data, image_format='jpeg'):
+    """Decode a stored image straight to a preprocessed grayscale face, or None"""
+    gray = decode_face_image(image_data, image_format, grayscale=True)
+    if gray is None:
+        return None
+    return preprocess_face(gray)
+
+def _collect(rows, futures):
+    faces, labels = [], []
+    for row, future in zip(rows, futures):
+        face = future.result()
+        if face is not None:
+            faces.append(face)
+            labels.append(row[1])
+    return faces, labels, rows[-1][0]
+
+def iter_training_batches(db, after_id=0, user_id=None, chunk_size=500, workers=None):
+    """
+    Stream face images from SQLite in chunks, decoding them on a thread pool
+
+    cv2.imdecode releases the GIL, so threads decode in parallel. Crops
+    stored in the png or raw formats are already FACE_SIZE and skip the
+    resize. The next chunk is decoded while the caller is still processing the current one.
+
+    Yields:
+        tuple: (faces, user_ids, last_image_id) for each chunk
+    """
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        pending = None
+        for rows in db.iter_face_image_rows(after_id, user_id, chunk_size):
+            futures = [executor.submit(decode_face, row[2], row[3]) for row in rows]
+            if pending:
+                yield _collect(*pending)
+            pending = (rows, futures)
+        if pending:
+            yield _collect(*pending)
+
+def fit_lbph(classifier, batches, label=None, on_progress=None):
+    """
+    Feed training batches into an LBPH model chunk by chunk
+
+    Trains a new model on the first chunk when classifier is None and calls
+    update() for the rest, so only one chunk of images is held at a time.
+    Labels are the user ids from each batch, or label for every image.
+    on_progress(images_added) is called after each chunk.
+
+    Returns:
+        tuple: (classifier, images_added, last_image_id)
+    """
+    added = 0
+    last_image_id = None
+    for faces, user_ids, last_image_id in batches:
+        if not faces:
+            continue
+        labels = np.full(len(faces), label, dtype=np.int32) if label is not None else np.array(user_ids, dtype=np.int32)
+        if classifier is None:
+            classifier = cv2.face.LBPHFaceRecognizer_create()
+            classifier.train(faces, labels)
+        else:
+            classifier.update(faces, labels)
+        added += len(faces)
+        if on_progress:
+            on_progress(added)
+    return classifier, added, last_image_id
+
+def train_user_classifier(db, user_id, incremental=True, chunk_size=500, workers=None, on_progress=None):
+    """
+    Train or update a user's LBPH classifier and save it to the database
+
+    With incremental=True and an existing classifier that records the last
+    image it was trained on, only face images stored after that one are fed
+    through LBPHFaceRecognizer.update(), so retraining time scales with the
+    number of new images. Otherwise the classifier is trained from scratch.
+    on_progress(images_done, images_total) is called after each chunk.
+
+    Returns:
+        dict: saved (bool), incremental (bool), new_images (int), image_count (int)
+    """
+    info = db.get_classifier_info(user_id)
+    classifier = None
+    after_id = 0
+    image_count = 0
+
+    # Classifiers saved before last_image_id existed (0) must be retrained fully
+    if incremental and info and info['last_image_id']:
+        classifier = db.get_classifier(user_id, cached=False)
+        if classifier is not None:
+            after_id = info['last_image_id']
+            image_count = info['image_count']
+
+    result = {'saved': False, 'incremental': classifier is not None}
+
+    progress = None
+    if on_progress:
+        total = db.get_face_image_count(user_id, after_id)
+        progress = lambda done: on_progress(done, total)
+
+    # All images belong to label 0 (this user)
+    batches = iter_training_batches(db, after_id, user_id, chunk_size, workers)
+    classifier, added, last_image_id = fit_lbph(classifier, batches, label=0, on_progress=progress)
+
+    result['new_images'] = added
+    result['image_count'] = image_count + added
+    if not added:
+        # Nothing new since the last training - the stored model is current
+        result['saved'] = info is not None
+        return result
+
+    result['saved'] = db.save_classifier(user_id, classifier, result['image_count'], last_image_id)
+    return result
@@ -0,0 +1,168 @@
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from database import FaceRecognitionDB
+from training import train_user_classifier
+
+# Per-process state, set up once by _init_worker in each pool process
+_worker_db = None
+_progress_queue = None
+
+def _init_worker(db_name, db_options, progress_queue):
+    global _worker_db, _progress_queue
+    _worker_db = FaceRecognitionDB(db_name, **db_options)
+    _progress_queue = progress_queue
+
+def _train_job(user_id, incremental, decode_workers):
+    """Runs in a pool process: train one user's classifier, reporting progress"""
+    def on_progress(done, total):
+        _progress_queue.put(('progress', user_id, done, total))
+
+    return train_user_classifier(_worker_db, user_id, incremental, workers=decode_workers,
+                                 on_progress=on_progress)
+
+class TrainingService:
+    """
+    Trains user classifiers in background processes.
+
+    Jobs go into a ProcessPoolExecutor with one process per core (by
+    default), so several users can train at once and the Tk thread never
+    blocks. Each process opens its own FaceRecognitionDB connection.
+    Submitting a user who is already queued is a no-op. If the user's job
+    has already started, it runs once more afterwards so images captured in
+    the meantime are not missed.
+
+    After a successful job the shared FaceIdentifier (if given) is synced
+    on a single background thread, so syncs never overlap. Progress and
+    completion come back as events from poll(), meant to be called from
+    the GUI thread:
+        ('progress', user_id, images_done, images_total)
+        ('done', user_id, result)   - result from train_user_classifier(),
+                                      plus 'synced' and 'error'
+        ('rebuilt', None, result)   - after rebuild_identifier(): 'images'
+                                      and 'error'
+    """
+    def __init__(self, db, identifier=None, max_workers=None):
+        self.identifier = identifier
+        self.max_workers = max_workers or os.cpu_count()
+        # Spawn rather than fork: the GUI process has Tk and camera threads
+        context = multiprocessing.get_context('spawn')
+        self._progress = context.Queue()
+        db_options = {
+            'image_format': db.image_format,
+            'image_store': db.image_store.root if db.image_store else None
+        }
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context,
+                                             initializer=_init_worker,
+                                             initargs=(db.db_name, db_options, self._progress))
+        self._sync_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="IdentifierSync")
+        self._events = queue.Queue()
+        self._jobs = {}
+        self._rerun = set()
+        self._rebuild_pending = False
+        self._closed = False
+        self._lock = threading.RLock()  # Done callbacks can run inline inside _start()
+
+    def submit(self, user_id, incremental=True):
+        """Queue a training job; returns False if the user already has one"""
+        with self._lock:
+            if self._closed:
+                return False
+            future = self._jobs.get(user_id)
+            if future is not None:
+                if future.running():
+                    self._rerun.add(user_id)
+                return False
+            self._start(user_id, incremental)
+            return True
+
+    def _start(self, user_id, incremental):
+        # Split the cores between the pool processes for parallel image decoding
+        decode_workers = max(1, os.cpu_count() // self.max_workers)
+        future = self._executor.submit(_train_job, user_id, incremental, decode_workers)
+        self._jobs[user_id] = future
+        future.add_done_callback(lambda f: self._finished(user_id, incremental, f))
+
+    def _finished(self, user_id, incremental, future):
+        """Runs on the executor's callback thread when a job ends"""
+        try:
+            result = future.result()
+            result['error'] = None
+        except Exception as e:
+            result = {'saved': False, 'error': str(e)}
+        result['synced'] = 0
+
+        if result['saved'] and self.identifier is not None:
+            self._sync_executor.submit(self._sync, user_id, incremental, result)
+        else:
+            self._complete(user_id, incremental, result)
+
+    def _sync(self, user_id, incremental, result):
+        try:
+            # Fold the new images into the shared identification model
+            result['synced'] = self.identifier.sync()
+        except Exception as e:
+            result['error'] = f"Identification model update failed: {e}"
+        self._complete(user_id, incremental, result)
+
+    def _complete(self, user_id, incremental, result):
+        with self._lock:
+            del self._jobs[user_id]
+            if user_id in self._rerun:
+                self._rerun.discard(user_id)
+                if not self._closed:
+                    try:
+                        self._start(user_id, incremental)
+                    except Exception as e:
+                        print(f"Error restarting training for user {user_id}: {e}")
+            # Queued under the lock, so is_queued() is never False before the event is visible
+            self._events.put(('done', user_id, result))
+
+    def rebuild_identifier(self):
+        """Queue a full retrain of the shared model, e.g. after users were deleted; returns False if one is already waiting"""
+        with self._lock:
+            if self._closed or self.identifier is None or self._rebuild_pending:
+                return False
+            # Same thread as the syncs, so the two never overlap
+            self._rebuild_pending = True
+            self._sync_executor.submit(self._rebuild)
+            return True
+
+    def _rebuild(self):
+        with self._lock:
+            # Deletions from here on need another rebuild
+            self._rebuild_pending = False
+        try:
+            result = {'images': self.identifier.rebuild(), 'error': None}
+        except Exception as e:
+            result = {'images': 0, 'error': f"Identification model rebuild failed: {e}"}
+        self._events.put(('rebuilt', None, result))
+
+    def is_queued(self, user_id):
+        """Whether the user has a job queued or running"""
+        with self._lock:
+            return user_id in self._jobs
+
+    def poll(self):
+        """Return the progress and completion events that arrived since the last call"""
+        events = []
+        while True:
+            try:
+                events.append(self._progress.get_nowait())
+            except queue.Empty:
+                break
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def shutdown(self, wait=True):
+        """Stop the worker processes; queued jobs that have not started are dropped"""
+        with self._lock:
+            self._closed = True
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        self._sync_executor.shutdown(wait=wait)
@@ -0,0 +1,392 @@
+import queue
+import threading
+from abc import ABC, abstractmethod
+from time import time
+import cv2
+from camera import open_frame_source
+from liveness import LivenessTracker
+from metrics import metrics
+from scheduler import StageScheduler
+from training import preprocess_face
+
+class FaceLoopWorker(threading.Thread, ABC):
+    """
+    Runs a camera loop on a worker thread so the Tk main loop stays responsive.
+
+    The worker never touches Tk or the database. It posts messages to
+    self.messages instead, which the GUI drains with poll_worker():
+        ('status', text)    - text for the page's status label
+        ('done', result)    - final result dict; always the last message
+
+    Annotated frames do not go through the queue: show() keeps only the
+    newest one in a single slot, which poll_worker() takes with
+    take_frame(). A GUI that falls behind skips frames instead of piling
+    them up in memory.
+
+    Detection, liveness and prediction run at the rates in stage_rates
+    (see StageScheduler); in between, their last results are reused. The
+    result dict includes the per-stage timings under 'stages'.
+
+    source is anything open_frame_source() accepts: a camera index, a video
+    file, an image directory or a FrameSource, so recorded sessions can be
+    replayed through the same loop.
+    """
+    window_name = "Face Loop"
+
+    def __init__(self, classifier, analyzer, spoofing_detector, source=0, stage_rates=None):
+        super().__init__(daemon=True)
+        self.classifier = classifier
+        self.analyzer = analyzer
+        self.spoofing_detector = spoofing_detector
+        # Smooths the spoofing decision over the last frames of this loop
+        self.liveness = LivenessTracker(spoofing_detector)
+        self.schedule = StageScheduler(stage_rates)
+        self.source = source
+        self.messages = queue.Queue()
+        self._frame = None  # Newest annotated frame not yet taken by the GUI
+        self._frame_lock = threading.Lock()
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        """Ask the loop to stop at the next frame"""
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def show(self, frame):
+        """Post an annotated frame for display, replacing one the GUI has not taken yet"""
+        with self._frame_lock:
+            self._frame = frame
+
+    def take_frame(self):
+        """Newest frame posted since the last call, or None"""
+        with self._frame_lock:
+            frame, self._frame = self._frame, None
+        return frame
+
+    def set_status(self, text):
+        self.messages.put(('status', text))
+
+    def predict_face(self, gray, box):
+        """Run the classifier on a face box of a grayscale frame"""
+        x, y, w, h = box
+        face = preprocess_face(gray[y:y+h, x:x+w])
+        with metrics.timer('classifier.predict'):
+            return self.classifier.predict(face)
+
+    def run(self):
+        result = {'cancelled': False, 'spoofing': False, 'error': None}
+        try:
+            result.update(self.loop())
+        except Exception as e:
+            print(f"{self.name} error: {e}")
+            result['error'] = str(e)
+        finally:
+            result['cancelled'] = self.cancelled
+            result['stages'] = self.schedule.get_stats()
+            self.messages.put(('done', result))
+
+    @abstractmethod
+    def loop(self):
+        """Camera loop; returns a dict merged into the final result"""
+
+    def show_spoofing_warning(self, cap, text, duration=2):
+        """Keep showing the spoofing warning for a few seconds before closing"""
+        warning_end_time = time() + duration
+        while time() < warning_end_time and not self.cancelled:
+            ret, frame = cap.read()
+            if ret:
+                cv2.rectangle(frame, (0, 0), (frame.shape[1]-1, frame.shape[0]-1), (0, 0, 255), 10)
+                cv2.putText(frame, text, (50, 50),
+                           cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 3)
+                self.show(frame)
+
+class VerificationWorker(FaceLoopWorker):
+    """Login face verification with delay and spoofing detection"""
+    window_name = "Face Verification"
+
+    # Timing parameters
+    min_verification_time = 12  # Minimum seconds to show verification
+    min_spoofing_time = 12      # Minimum seconds to show spoofing warning
+    max_timeout = 30            # Maximum time to attempt verification
+
+    def __init__(self, username, classifier, analyzer, spoofing_detector, source=0, stage_rates=None):
+        super().__init__(classifier, analyzer, spoofing_detector, source, stage_rates)
+        self.username = username
+
+    def loop(self):
+        cap = open_frame_source(self.source).start()
+        try:
+            return self._verify(cap)
+        finally:
+            cap.release()
+
+    def _verify(self, cap):
+        start_time = time()
+        verified = False
+        spoofing_detected = False
+        verification_start_time = 0
+        spoofing_start_time = 0
+
+        while not self.cancelled:
+            ret, frame = cap.read()
+            if not ret:
+                break
+
+            current_time = time()
+            elapsed_time = current_time - start_time
+
+            # Grayscale and face boxes are computed once and shared with the spoofing check
+            analysis = self.schedule.run('detect', self.analyzer.analyze, frame)
+            gray, faces = analysis.gray, analysis.faces
+
+            # Spoofing decision over the recent frames, not just this one
+            is_spoofing, spoofing_confidence = self.schedule.run('liveness', self.liveness.update, analysis)
+
+            if is_spoofing and not spoofing_detected:
+                spoofing_detected = True
+                spoofing_start_time = current_time
+
+            # If spoofing was detected but now it's gone, reset
+            if spoofing_detected and not is_spoofing:
+                spoofing_detected = False
+
+            if len(faces) > 0:
+                (x, y, w, h) = faces[0]
+
+                if spoofing_detected:
+                    # Draw spoofing warning
+                    cv2.rectangle(frame, (0, 0), (frame.shape[1]-1, frame.shape[0]-1), (0, 0, 255), 10)
+                    cv2.putText(frame, "SPOOFING DETECTED!", (50, 50),
+                               cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 3)
+                    cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 0, 255), 2)
+                    cv2.putText(frame, "FAKE FACE", (x, y-10),
+                               cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+                else:
+                    # Only proceed with verification if no spoofing detected
+                    id, confidence = self.schedule.run('predict', self.predict_face, gray, (x, y, w, h))
+                    confidence = 100 - confidence
+
+                    if confidence > 60:  # Verification threshold
+                        if not verified:
+                            verification_start_time = current_time
+                        verified = True
+                        text = f'Hi: {self.username}'
+                        color = (0, 255, 0)
+                    else:
+                        verified = False
+                        text = "Unkown User"
+                        color = (0, 0, 255)
+
+                    cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
+                    cv2.putText(frame, text, (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+
+                    # Add border color based on verification status
+                    border_color = (0, 255, 0) if verified else (0, 0, 255)
+                    cv2.rectangle(frame, (0, 0), (frame.shape[1]-1, frame.shape[0]-1), border_color, 10)
+            else:
+                # Never reuse a prediction for a face that has gone
+                self.schedule.invalidate('predict')
+
+            # Show the frame
+            self.schedule.run('display', self.show, frame)
+
+            # Check conditions to end verification
+            if spoofing_detected:
+                # Require spoofing to persist for minimum time
+                if (current_time - spoofing_start_time) >= self.min_spoofing_time:
+                    break
+            elif verified:
+                # Require verification to persist for minimum time
+                if (current_time - verification_start_time) >= self.min_verification_time:
+                    break
+
+            # Timeout after max_timeout seconds
+            if elapsed_time >= self.max_timeout:
+                break
+
+        if spoofing_detected:
+            self.show_spoofing_warning(cap, "SPOOFING DETECTED!")
+            return {'verified': False, 'spoofing': True}
+
+        # A cancelled verification never counts as a successful login
+        return {'verified': verified and not self.cancelled}
+
+class RecognitionWorker(FaceLoopWorker):
+    """
+    Face recognition against the current user's classifier.
+
+    With labels (a user_id -> username dict) and a FaceIdentifier as the
+    classifier, it runs 1:N identification and reports who was recognized.
+    """
+    window_name = "Face Recognition"
+
+    # Minimum durations
+    min_recognition_time = 3  # seconds to show recognition
+    min_spoofing_time = 3     # seconds to show spoofing warning
+    max_timeout = 30          # total timeout
+
+    def __init__(self, classifier, analyzer, spoofing_detector, source=0, labels=None, stage_rates=None):
+        super().__init__(classifier, analyzer, spoofing_detector, source, stage_rates)
+        self.labels = labels
+
+    def loop(self):
+        cap = open_frame_source(self.source).start()
+        try:
+            return self._recognize(cap)
+        finally:
+            cap.release()
+
+    def _recognize(self, cap):
+        start_time = time()
+        recognized = False
+        confidence_level = 0
+        last_face_time = time()
+        spoofing_detected = False
+        spoofing_start_time = 0
+        recognition_start_time = 0
+        recognized_id = None
+
+        self.set_status("Looking for face...")
+
+        while not self.cancelled:
+            ret, frame = cap.read()
+            if not ret:
+                break
+
+            # Grayscale and face boxes are computed once and shared with the spoofing check
+            analysis = self.schedule.run('detect', self.analyzer.analyze, frame)
+            gray, faces = analysis.gray, analysis.faces
+
+            current_time = time()
+            elapsed_time = current_time - start_time
+
+            # Spoofing decision over the recent frames, not just this one
+            spoofing_result, spoofing_confidence = self.schedule.run('liveness', self.liveness.update, analysis)
+
+            if len(faces) > 0:
+                last_face_time = current_time
+                (x, y, w, h) = faces[0]
+
+                # Track when spoofing is first detected
+                if spoofing_result and not spoofing_detected:
+                    spoofing_detected = True
+                    spoofing_start_time = current_time
+
+                # If spoofing was detected but now it's gone, reset
+                if spoofing_detected and not spoofing_result:
+                    spoofing_detected = False
+
+                # The tracker already smooths the decision, so no grace period is needed
+                if not spoofing_detected:
+                    try:
+                        id, confidence = self.schedule.run('predict', self.predict_face, gray, (x, y, w, h))
+                        confidence_level = 100 - confidence
+
+                        if self.labels is not None and id not in self.labels:
+                            confidence_level = 0  # Identified as a user that no longer exists
+
+                        if confidence_level > 50:  # Recognition threshold
+                            if not recognized or id != recognized_id:
+                                recognition_start_time = current_time
+                            recognized = True
+                            recognized_id = id
+                            text = f'Hi: {self.labels[id]}' if self.labels is not None else 'Recognized'
+                            color = (0, 255, 0)
+                        else:
+                            recognized = False
+                            text = "Unknown User"
+                            color = (0, 0, 255)
+                            self.set_status("Verification failed")
+
+                        cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
+                        cv2.putText(frame, text, (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+
+                        # Add additional visual feedback
+                        if recognized:
+                            # Draw a green border around the entire frame when recognized
+                            cv2.rectangle(frame, (0, 0), (frame.shape[1]-1, frame.shape[0]-1), (0, 255, 0), 10)
+                        else:
+                            # Draw a red border when not recognized
+                            cv2.rectangle(frame, (0, 0), (frame.shape[1]-1, frame.shape[0]-1), (0, 0, 255), 10)
+
+                    except Exception as e:
+                        print(f"Recognition error: {e}")
+                        recognized = False
+                else:
+                    # Spoofing detected for more than 1 second - show warning
+                    recognized = False
+                    self.set_status("Spoofing detected!")
+
+                    # Draw spoofing warning on frame
+                    cv2.rectangle(frame, (0, 0), (frame.shape[1]-1, frame.shape[0]-1), (0, 0, 255), 10)
+                    cv2.putText(frame, "SPOOFING ATTACK DETECTED!", (50, 50),
+                                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 3)
+
+                    # Draw the face rectangle in red
+                    cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 0, 255), 2)
+                    cv2.putText(frame, f"FAKE FACE", (x, y-10),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+            else:
+                # No face detected
+                if current_time - last_face_time > 2:  # 2 seconds without face
+                    self.set_status("No face detected")
+                recognized = False
+                spoofing_detected = False
+                # Never reuse a prediction for a face that has gone
+                self.schedule.invalidate('predict')
+
+            # Show the frame
+            self.schedule.run('display', self.show, frame)
+
+            # Check conditions to end recognition
+            if recognized and (current_time - recognition_start_time) >= self.min_recognition_time:
+                break
+
+            if spoofing_detected and (current_time - spoofing_start_time) >= self.min_spoofing_time:
+                break
+
+            # Timeout after max_timeout seconds
+            if elapsed_time >= self.max_timeout:
+                break
+
+        if spoofing_detected:
+            self.show_spoofing_warning(cap, "SPOOFING ATTACK DETECTED!")
+            return {'recognized': False, 'spoofing': True}
+
+        return {'recognized': recognized and not self.cancelled, 'confidence': confidence_level,
+                'user_id': recognized_id if recognized else None}
+
+def poll_worker(widget, worker, on_done, on_status=None, interval=15):
+    """
+    Drain a FaceLoopWorker's message queue from the Tk main loop
+
+    Shows the worker's newest frame with cv2.imshow, forwards status text to
+    on_status and calls on_done(result) once the worker has finished.
+    Pressing 'q' in the video window cancels the worker. Reschedules itself
+    with widget.after() until the 'done' message arrives.
+    """
+    while True:
+        try:
+            kind, value = worker.messages.get_nowait()
+        except queue.Empty:
+            break
+
+        if kind == 'status':
+            if on_status:
+                on_status(value)
+        elif kind == 'done':
+            cv2.destroyAllWindows()
+            on_done(value)
+            return
+
+    frame = worker.take_frame()
+    if frame is not None:
+        with metrics.timer('gui.imshow'):
+            cv2.imshow(worker.window_name, frame)
+    if cv2.waitKey(1) & 0xFF == ord('q'):
+        worker.cancel()
+
+    widget.after(interval, poll_worker, widget, worker, on_done, on_status, interval)